@@ -0,0 +1,154 @@
+import argparse, multiprocessing, os, statistics, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "multi_recorder"))
+import record_dispatcher
+from device_cards import connection_status_text, describe_card
+from device_manager import DeviceManager, DeviceSettings
+from device_metadata import DeviceMetadata
+from instrumentation import FrameProfiler
+from sharded_manager import ShardedDeviceManager
+from simulators import serve_fleet
+from view_model import ViewModel
+
+# Runs MultiRecorder's device layer against simulated devices and reports how it scales: frame time
+# of the render loop's status reads, requests per second each device receives, record-all start
+# skew, how long an OBS profile change takes to show up and memory. The simulators run in a separate process so they don't skew the measurements.
+# Usage: python bench_load.py --devices 1,10,50,100 --duration 5 --latency 0.005 --jitter 0.005
+
+PROFILE_FPS = 30 # Frame rate the simulated OBS instances switch to partway through a run, they start at 60
+
+COLORS = {'white': (255, 255, 255, 255), 'red': (255, 0, 0, 255), 'yellow': (255, 255, 0, 255), 'green': (0, 200, 0, 255)}
+
+# The per-device and status work of MultiRecorder's render loop with the card layout, with the view model
+# writing to a dict instead of dearpygui. Returns the store version it described and how many widgets changed.
+def render_frame(manager, view, profiler, rendered_store_version):
+    store_version = manager.store.version
+    if store_version != rendered_store_version:
+        for device in profiler.devices(manager.obs_devices):
+            describe_card(view, device, manager.store.get(device.key), COLORS)
+        profiler.phase("obs")
+
+        for device in profiler.devices(manager.blackmagic_devices):
+            describe_card(view, device, manager.store.get(device.key), COLORS)
+        profiler.phase("blackmagic")
+
+        view.set_value("connection_status", connection_status_text(manager.store.counts()))
+    profiler.phase("status")
+
+    updates = view.flush()
+    profiler.phase("flush")
+    profiler.end_frame()
+    return store_version, updates
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def request_count(stats):
+    return sum(device['requests'] for device in stats['obs'] + stats['hyperdecks'])
+
+def run_scale(count, args):
+    obs_count = round(count * args.obs_fraction)
+    parent_conn, child_conn = multiprocessing.Pipe()
+    fleet = multiprocessing.Process(target=serve_fleet, args=(child_conn,), daemon=True, kwargs={
+        'obs_count': obs_count, 'hyperdeck_count': count - obs_count,
+        'latency': args.latency, 'jitter': args.jitter, 'failure_rate': args.failure_rate, 'seed': 0})
+    fleet.start()
+    parent_conn.send("config")
+    config = parent_conn.recv()
+
+    # Memory is traced over connecting and the first second of polling, tracing slows everything else down
+    tracemalloc.start()
+    started = time.perf_counter()
+    settings = DeviceSettings(startup_timeout=args.startup_timeout, poll_interval=args.poll_interval,
+                              idle_poll_interval=args.idle_poll_interval)
+    manager = ShardedDeviceManager(settings, shards=args.shards) if args.shards > 1 else DeviceManager(settings)
+    manager.connect(config)
+    connect_seconds = time.perf_counter() - started
+    manager.start()
+    time.sleep(1)
+    memory, memory_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Half the run idle and half recording, devices are polled at different rates in each
+    parent_conn.send("stats")
+    requests_before = request_count(parent_conn.recv())
+    widgets = {}
+    view = ViewModel(widgets.__setitem__, lambda tag, **config: widgets.__setitem__((tag, "config"), config))
+    profiler = FrameProfiler()
+    rendered_store_version = None
+    frame_times = []
+    frame_updates = []
+    frame_frequency = 1 / args.fps
+    run_started = time.perf_counter()
+    results = []
+    profile_changed = profile_seconds = None
+    while (now := time.perf_counter()) - run_started < args.duration:
+        if not results and now - run_started >= args.duration / 2:
+            results = manager.record_all()
+        # OBS pushes CurrentProfileChanged, the devices' metadata should be refetched straight away
+        if profile_changed is None and obs_count and now - run_started >= args.duration / 4:
+            parent_conn.send(("profile", PROFILE_FPS))
+            parent_conn.recv()
+            profile_changed = time.perf_counter()
+        elif profile_changed is not None and profile_seconds is None and all(
+                (manager.store.get(device.key).metadata or DeviceMetadata()).fps == PROFILE_FPS for device in manager.obs_devices):
+            profile_seconds = time.perf_counter() - profile_changed
+        frame_started = time.perf_counter()
+        rendered_store_version, updates = render_frame(manager, view, profiler, rendered_store_version)
+        frame_times.append(time.perf_counter() - frame_started)
+        frame_updates.append(updates)
+        time.sleep(max(0.0, frame_frequency - (time.perf_counter() - frame_started)))
+        profiler.phase("sleep")
+    parent_conn.send("stats")
+    stats = parent_conn.recv()
+    run_seconds = time.perf_counter() - run_started
+
+    # Skew as the devices saw it, from the time each one started recording
+    starts = [device['record_starts'][-1] for device in stats['obs'] + stats['hyperdecks'] if device['record_starts']]
+    device_skew = max(starts) - min(starts) if len(starts) > 1 else 0.0
+
+    manager.stop_all()
+    manager.close()
+    parent_conn.send("stop")
+    fleet.join(timeout=5)
+
+    return {
+        'devices': count,
+        'connected': len(manager.devices),
+        'connect_ms': connect_seconds * 1000,
+        'frame_mean_ms': statistics.fmean(frame_times) * 1000,
+        'frame_p99_ms': percentile(frame_times, 0.99) * 1000,
+        'updates_per_frame': statistics.fmean(frame_updates),
+        'requests_per_device': (request_count(stats) - requests_before) / run_seconds / max(1, count),
+        'dispatch_skew_ms': record_dispatcher.start_skew(results) * 1000,
+        'device_skew_ms': device_skew * 1000,
+        'profile_ms': profile_seconds * 1000 if profile_seconds is not None else None,
+        'memory_mib': memory / 2**20,
+        'memory_peak_mib': memory_peak / 2**20,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="bench_load")
+    parser.add_argument('--devices', type=str, default="1,10,50,100", help='Comma separated device counts to run.')
+    parser.add_argument('--obs-fraction', type=float, default=0.5, help='Fraction of the devices that are OBS, the rest are HyperDecks.')
+    parser.add_argument('--duration', type=float, default=5, help='Seconds to run the render loop for at each device count.')
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--idle-poll-interval', type=float, default=1)
+    parser.add_argument('--startup-timeout', type=float, default=10)
+    parser.add_argument('--shards', type=int, default=1, help='Worker processes to split the devices across, memory is only traced in this process.')
+    args = parser.parse_args()
+
+    rows = [run_scale(int(count), args) for count in args.devices.split(",")]
+
+    print(f"{'devices':>8} {'connected':>10} {'connect':>10} {'frame avg':>10} {'frame p99':>10} {'updates':>10} {'req/s/dev':>10} "
+          f"{'skew sent':>10} {'skew dev':>10} {'profile':>10} {'memory':>10} {'peak':>10}")
+    for row in rows:
+        profile = f"{row['profile_ms']:.1f}ms" if row['profile_ms'] is not None else "-"
+        print(f"{row['devices']:>8} {row['connected']:>10} {row['connect_ms']:>8.0f}ms {row['frame_mean_ms']:>8.3f}ms "
+              f"{row['frame_p99_ms']:>8.3f}ms {row['updates_per_frame']:>10.2f} {row['requests_per_device']:>10.1f} {row['dispatch_skew_ms']:>8.1f}ms "
+              f"{row['device_skew_ms']:>8.1f}ms {profile:>10} {row['memory_mib']:>7.1f}MiB {row['memory_peak_mib']:>7.1f}MiB")
@@ -0,0 +1,60 @@
+import argparse, base64, io, os, sys, time, tracemalloc
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "multi_recorder"))
+from previews import PREVIEW_WIDTH, decode_preview
+
+# Compares the array-backed preview decoder with the original list-based one on a synthetic JPEG screenshot.
+# Usage: python bench_preview_decode.py --width 1920 --height 1080 --repeat 3
+
+# The decoder MultiRecorder used before previews.decode_preview, kept here as the baseline
+def decode_base64_to_image(base64_string):
+    image_bytes = base64.b64decode(base64_string)
+    image = Image.open(io.BytesIO(image_bytes))
+    image_list = list(image.getdata())
+    alpha_image_list = [(r, g, b, 255) for r, g, b in image_list]
+    image_list_1d = [float(i)/255 for sublist in alpha_image_list for i in sublist]
+    return image_list_1d
+
+# Build a base64 JPEG with some detail in it, similar to what OBS returns at quality 10
+def make_screenshot(width, height):
+    image = Image.linear_gradient("L").resize((width, height))
+    image = Image.merge("RGB", (image, image.transpose(Image.FLIP_LEFT_RIGHT), image.transpose(Image.FLIP_TOP_BOTTOM)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=10)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+# Run a decoder and return (best seconds, peak traced memory in bytes)
+def measure(decode, repeat):
+    best = float("inf")
+    peak = 0
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = decode()
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        del result
+    return best, peak
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="bench_preview_decode")
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-legacy', default=False, action='store_true', help='Skip the slow list-based decoder.')
+    args = parser.parse_args()
+
+    screenshot = make_screenshot(args.width, args.height)
+    cases = [
+        ("array, full resolution", lambda: decode_preview(screenshot)),
+        (f"array, downscaled to {PREVIEW_WIDTH}px", lambda: decode_preview(screenshot, max_width=PREVIEW_WIDTH)),
+    ]
+    if not args.skip_legacy:
+        cases.insert(0, ("list (legacy)", lambda: decode_base64_to_image(screenshot)))
+
+    print(f"Decoding a {args.width}x{args.height} JPEG, best of {args.repeat}")
+    for name, decode in cases:
+        seconds, peak = measure(decode, args.repeat)
+        print(f"{name:<32} {seconds * 1000:10.1f} ms {peak / 2**20:10.1f} MiB peak")
@@ -0,0 +1,108 @@
+import argparse, multiprocessing, os, re, statistics, subprocess, sys, tempfile, time
+import yaml
+from simulators import serve_fleet
+
+# Measures MultiRecorder's cold launch against simulated devices: time from starting the process until
+# the first frame is drawn (or until connected with --headless), MultiRecorder's own startup phases, and
+# where the import time goes from python -X importtime. The first run also pays for compiling bytecode
+# so it's reported separately. Pass budgets to fail when startup regresses.
+# Usage: python bench_startup.py --runs 5 --obs 4 --hyperdecks 4 --max-import-ms 300
+#        python bench_startup.py --headless -- --show-previews
+
+MULTIRECORDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "multi_recorder", "MultiRecorder.py")
+
+# Self time in microseconds of every module in python -X importtime output. Devices connect on several
+# threads, which throws off the nesting importtime shows, and a thread waiting for another thread to
+# finish importing a module reports it again with the wait as its time, so only the first report counts.
+def parse_importtime(text):
+    imports = {}
+    for line in text.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+\d+ \| +(\S+)", line)
+        if match and match.group(2) not in imports:
+            imports[match.group(2)] = int(match.group(1))
+    return imports
+
+def run_once(config_path, args):
+    command = [sys.executable, "-X", "importtime", MULTIRECORDER, "--config-file", config_path, "--exit-after-startup"]
+    if args.headless:
+        command += ["--headless", "--api-port", "0"]
+    command += args.app_args
+    with tempfile.TemporaryFile("w+") as stderr:
+        started = time.perf_counter()
+        process = subprocess.Popen(command, cwd=os.path.dirname(MULTIRECORDER), stdout=subprocess.PIPE, stderr=stderr, text=True,
+                                   env=dict(os.environ, PYTHONUNBUFFERED="1"))
+        ready = None
+        output = []
+        for line in process.stdout:
+            output.append(line)
+            if ready is None and line.startswith("Startup took"):
+                ready = time.perf_counter() - started
+        process.wait()
+        stderr.seek(0)
+        imports = parse_importtime(stderr.read())
+
+    if ready is None:
+        sys.exit(f"MultiRecorder didn't finish starting (exit code {process.returncode}):\n{''.join(output[-20:])}")
+    phases = {match.group(1): float(match.group(2)) for match in (re.match(r" - (.+): (\d+) ms", line) for line in output) if match}
+    return {
+        'ready_ms': ready * 1000,
+        'import_ms': sum(imports.values()) / 1000,
+        'phases': phases,
+        'imports': imports,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="bench_startup")
+    parser.add_argument('--runs', type=int, default=5, help='Launches to measure, after the first one.')
+    parser.add_argument('--obs', type=int, default=2)
+    parser.add_argument('--hyperdecks', type=int, default=2)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--headless', action='store_true', help='Measure headless startup, for machines without a display.')
+    parser.add_argument('--top', type=int, default=15, help='Number of slowest packages to list.')
+    parser.add_argument('--max-ready-ms', type=float, default=None, help='Fail if the median time until ready is over this.')
+    parser.add_argument('--max-import-ms', type=float, default=None, help='Fail if the median import time is over this.')
+    parser.add_argument('app_args', nargs='*', help='Extra MultiRecorder args, after --.')
+    args = parser.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    fleet = multiprocessing.Process(target=serve_fleet, args=(child_conn,), daemon=True, kwargs={
+        'obs_count': args.obs, 'hyperdeck_count': args.hyperdecks, 'latency': args.latency, 'seed': 0})
+    fleet.start()
+    parent_conn.send("config")
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False) as f:
+        yaml.safe_dump(parent_conn.recv(), f, sort_keys=False)
+        config_path = f.name
+
+    try:
+        first = run_once(config_path, args)
+        runs = [run_once(config_path, args) for _ in range(args.runs)]
+    finally:
+        os.unlink(config_path)
+        parent_conn.send("stop")
+        fleet.join(timeout=5)
+
+    print(f"{'run':>6} {'ready':>10} {'imports':>10}  phases")
+    for name, run in [("first", first)] + [(str(i + 1), run) for i, run in enumerate(runs)]:
+        phases = ", ".join(f"{phase} {ms:.0f}" for phase, ms in run['phases'].items())
+        print(f"{name:>6} {run['ready_ms']:>8.0f}ms {run['import_ms']:>8.0f}ms  {phases}")
+    ready_ms = statistics.median(run['ready_ms'] for run in runs)
+    import_ms = statistics.median(run['import_ms'] for run in runs)
+    print(f"{'median':>6} {ready_ms:>8.0f}ms {import_ms:>8.0f}ms")
+
+    # Import time by top level package, from the run that took the median time
+    median_run = sorted(runs, key=lambda run: run['ready_ms'])[len(runs) // 2]
+    packages = {}
+    for module, self_us in median_run['imports'].items():
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print(f"\nSlowest packages to import (ms, median run):")
+    for package, self_us in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"  {package:<32} {self_us / 1000:>8.1f}")
+
+    failed = []
+    if args.max_ready_ms is not None and ready_ms > args.max_ready_ms:
+        failed.append(f"ready in {ready_ms:.0f} ms, budget {args.max_ready_ms:.0f} ms")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        failed.append(f"imports took {import_ms:.0f} ms, budget {args.max_import_ms:.0f} ms")
+    if failed:
+        sys.exit("Over budget: " + "; ".join(failed))
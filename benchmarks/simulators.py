@@ -0,0 +1,500 @@
+import argparse, base64, hashlib, io, json, random, socket, socketserver, struct, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+
+# Stand-ins for OBS (obs-websocket v5) and BlackMagic HyperDeck (REST /control/api/v1) that run
+# locally, so MultiRecorder can be exercised and benchmarked without any hardware. Both inject
+# latency, jitter and failures according to a FaultProfile.
+#
+# Run a fleet on its own and point MultiRecorder at it:
+#   python simulators.py --obs 10 --hyperdecks 10 --latency 0.02 --write-config sim_config.yaml
+#   python ../multi_recorder/MultiRecorder.py -c sim_config.yaml
+
+# How a simulated device misbehaves. Every request is delayed by latency plus up to jitter
+# seconds, and fails outright with probability failure_rate.
+class FaultProfile:
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    # Sleep for this request's latency, then return whether it should fail
+    def apply(self):
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            fail = self._random.random() < self.failure_rate
+        if delay > 0:
+            time.sleep(delay)
+        return fail
+
+# Recording state shared by both simulators. Timestamps use time.time() so they can be
+# compared across processes.
+class RecorderState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.recording = False
+        self.paused = False
+        self.started_at = 0.0
+        self.paused_at = 0.0
+        self.paused_ms = 0.0
+        self.record_starts = []
+        self.requests = 0
+        self.failures = 0
+
+    def start(self):
+        if not self.recording:
+            self.recording, self.paused = True, False
+            self.started_at = time.time()
+            self.paused_ms = 0.0
+            self.record_starts.append(self.started_at)
+            return True
+        return False
+
+    def stop(self):
+        if self.recording:
+            self.recording, self.paused = False, False
+            return True
+        return False
+
+    def pause(self, paused):
+        if self.recording and self.paused != paused:
+            now = time.time()
+            if paused:
+                self.paused_at = now
+            else:
+                self.paused_ms += (now - self.paused_at) * 1000
+            self.paused = paused
+            return True
+        return False
+
+    def duration_ms(self):
+        if not self.recording:
+            return 0
+        end = self.paused_at if self.paused else time.time()
+        return int((end - self.started_at) * 1000 - self.paused_ms)
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests, 'failures': self.failures, 'record_starts': list(self.record_starts)}
+
+def format_timecode(duration_ms):
+    duration_ms = int(max(0, duration_ms))
+    hours, remainder = divmod(duration_ms, 3600000)
+    minutes, remainder = divmod(remainder, 60000)
+    seconds, milliseconds = divmod(remainder, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
+
+# HyperDeck REST API stand-in, only the endpoints HyperDeckClient uses. Injected failures
+# answer 503, which HyperDeckClient retries like a real overloaded deck.
+class MockHyperDeck:
+    def __init__(self, host="127.0.0.1", port=0, faults=None, width=1920, height=1080, frame_rate="50", codec="H.264"):
+        self.faults = faults or FaultProfile()
+        self.state = RecorderState()
+        self.clip = {'videoFormat': {'width': width, 'height': height, 'frameRate': frame_rate}, 'codecFormat': {'codec': codec}}
+        # Two slots, the second with more space so preparing for a recording has something to switch to
+        self.workingset = [
+            {'index': 0, 'activeDisk': True, 'volume': "Media 1", 'deviceName': "sd1", 'remainingRecordTime': 3600},
+            {'index': 1, 'activeDisk': False, 'volume': "Media 2", 'deviceName': "sd2", 'remainingRecordTime': 7200},
+        ]
+        self.clip_names = []
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock_hyperdeck", daemon=True)
+
+    # Host as HyperDeckClient and the config file expect it, including the port
+    @property
+    def host(self):
+        host, port = self._server.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        deck = self
+        prefix = "/control/api/v1/"
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this delayed ACKs add ~40 ms per request
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._handle(None)
+
+            def do_PUT(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self._handle(json.loads(self.rfile.read(length) or b"{}"))
+
+            def _handle(self, body):
+                state = deck.state
+                fail = deck.faults.apply()
+                with state.lock:
+                    state.requests += 1
+                    state.failures += fail
+                if fail:
+                    return self._send(503, {'error': "Injected failure"})
+                if not self.path.startswith(prefix):
+                    return self._send(404, {'error': f"Unknown endpoint {self.path}"})
+
+                endpoint = self.path[len(prefix):].removeprefix("transports/0/")
+                with state.lock:
+                    if endpoint == "record" and body is not None:
+                        if body.get('recording') and not state.recording and body.get('clipName'):
+                            deck.clip_names.append(body['clipName'])
+                        state.start() if body.get('recording') else state.stop()
+                        return self._send(204)
+                    if endpoint == "media/active" and body is not None:
+                        if state.recording or not any(slot['index'] == body.get('workingsetIndex') for slot in deck.workingset):
+                            return self._send(400, {'error': "Can't change the active slot"})
+                        for slot in deck.workingset:
+                            slot['activeDisk'] = slot['index'] == body['workingsetIndex']
+                        return self._send(204)
+                    if body is not None:
+                        return self._send(405, {'error': "Method not allowed"})
+                    if endpoint == "record":
+                        return self._send(200, {'recording': state.recording})
+                    if endpoint == "media/workingset":
+                        return self._send(200, {'size': len(deck.workingset), 'workingset': deck.workingset})
+                    if endpoint == "timecode":
+                        duration_ms = state.duration_ms()
+                        frames = int(duration_ms % 1000 * float(deck.clip['videoFormat']['frameRate']) / 1000)
+                        timecode = f"{format_timecode(duration_ms)[:-4]}:{frames:02}"
+                        return self._send(200, {'display': timecode, 'timeline': timecode})
+                    if endpoint == "clip":
+                        return self._send(200, {'clip': deck.clip})
+                    if endpoint == "inputVideoSource":
+                        return self._send(200, {'inputVideoSource': "SDI"})
+                return self._send(404, {'error': f"Unknown endpoint {self.path}"})
+
+            def _send(self, code, body=None):
+                data = json.dumps(body).encode() if body is not None else b""
+                self.send_response(code)
+                if body is not None:
+                    self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+OUTPUTS_SUBSCRIPTION = 1 << 6
+CONFIG_SUBSCRIPTION = 1 << 1
+
+# One client connection to MockObs, speaking just enough of RFC 6455 for websocket-client
+class WebSocketConnection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.subscriptions = 0
+        self.identified = False
+        self._send_lock = threading.Lock()
+        self._reader = sock.makefile("rb")
+
+    def handshake(self):
+        request = self._reader.readline()
+        headers = {}
+        while True:
+            line = self._reader.readline().decode().strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if not request.startswith(b"GET") or "sec-websocket-key" not in headers:
+            self.sock.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        accept = base64.b64encode(hashlib.sha1((headers["sec-websocket-key"] + WEBSOCKET_GUID).encode()).digest()).decode()
+        self.sock.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                           f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return True
+
+    # Next text message from the client, None once the connection is closed
+    def receive(self):
+        message = b""
+        while True:
+            header = self._reader.read(2)
+            if len(header) < 2:
+                return None
+            fin, opcode = header[0] & 0x80, header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self._reader.read(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self._reader.read(8))[0]
+            mask = self._reader.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+            payload = bytearray(self._reader.read(length))
+            for i in range(len(payload)):
+                payload[i] ^= mask[i % 4]
+
+            if opcode == 0x8:
+                self._send_frame(0x8, bytes(payload[:2]))
+                return None
+            if opcode == 0x9:
+                self._send_frame(0xA, bytes(payload))
+                continue
+            if opcode in (0x0, 0x1, 0x2):
+                message += payload
+                if fin:
+                    return message.decode()
+
+    def send(self, op, data):
+        self._send_frame(0x1, json.dumps({'op': op, 'd': data}).encode())
+
+    def _send_frame(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack("!BB", 0x80 | opcode, length)
+        elif length < 1 << 16:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack("!BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            self.sock.sendall(header + payload)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+# obs-websocket v5 stand-in covering the requests MultiRecorder makes. RecordStateChanged events
+# are pushed to clients subscribed to output events. Injected failures answer with a failed
+# requestStatus, which obsws_python raises as an OBSSDKRequestError.
+class MockObs:
+    def __init__(self, host="127.0.0.1", port=0, faults=None, width=1920, height=1080, fps=60):
+        self.faults = faults or FaultProfile()
+        self.state = RecorderState()
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.record_directory = ""
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self._screenshots = {}
+        self._server = socketserver.ThreadingTCPServer((host, port), self._make_handler(), bind_and_activate=False)
+        self._server.allow_reuse_address = True
+        self._server.daemon_threads = True
+        self._server.server_bind()
+        self._server.server_activate()
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock_obs", daemon=True)
+
+    @property
+    def host(self):
+        return self._server.server_address[0]
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        with self._connections_lock:
+            connections = list(self._connections)
+        for connection in connections:
+            connection.close()
+
+    def _make_handler(self):
+        mock = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                connection = WebSocketConnection(self.request)
+                if not connection.handshake():
+                    return
+                with mock._connections_lock:
+                    mock._connections.add(connection)
+                try:
+                    connection.send(0, {'obsWebSocketVersion': "5.0.0", 'rpcVersion': 1})
+                    while (message := connection.receive()) is not None:
+                        mock._handle_message(connection, json.loads(message))
+                except (OSError, ValueError):
+                    pass
+                finally:
+                    with mock._connections_lock:
+                        mock._connections.discard(connection)
+                    connection.close()
+
+        return Handler
+
+    def _handle_message(self, connection, message):
+        op, data = message.get('op'), message.get('d') or {}
+        if op == 1:
+            connection.subscriptions = data.get('eventSubscriptions') or 0
+            connection.identified = True
+            connection.send(2, {'negotiatedRpcVersion': 1})
+        elif op == 6 and connection.identified:
+            request_type = data.get('requestType')
+            response = {'requestType': request_type, 'requestId': data.get('requestId')}
+            state = self.state
+            fail = self.faults.apply()
+            with state.lock:
+                state.requests += 1
+                state.failures += fail
+            if fail:
+                response['requestStatus'] = {'result': False, 'code': 500, 'comment': "Injected failure"}
+            else:
+                try:
+                    response_data, event = self._request(request_type, data.get('requestData') or {})
+                    response['requestStatus'] = {'result': True, 'code': 100}
+                    if response_data is not None:
+                        response['responseData'] = response_data
+                except KeyError:
+                    response['requestStatus'] = {'result': False, 'code': 204, 'comment': f"Unknown request {request_type}"}
+                    event = None
+            connection.send(7, response)
+            if event is not None:
+                self._broadcast(OUTPUTS_SUBSCRIPTION, "RecordStateChanged", event)
+
+    # Handle one request, returns its response data and the RecordStateChanged event data to push, if any
+    def _request(self, request_type, request_data):
+        state = self.state
+        with state.lock:
+            if request_type == "GetRecordStatus":
+                duration = state.duration_ms()
+                return {'outputActive': state.recording, 'outputPaused': state.paused, 'outputTimecode': format_timecode(duration),
+                        'outputDuration': duration, 'outputBytes': duration * 1000}, None
+            if request_type in ("StartRecord", "StopRecord", "ToggleRecord"):
+                start = request_type == "StartRecord" or (request_type == "ToggleRecord" and not state.recording)
+                changed = state.start() if start else state.stop()
+                output_state = "OBS_WEBSOCKET_OUTPUT_STARTED" if start else "OBS_WEBSOCKET_OUTPUT_STOPPED"
+                response = {'outputActive': state.recording} if request_type == "ToggleRecord" else None
+                return response, {'outputActive': state.recording, 'outputState': output_state} if changed else None
+            if request_type in ("PauseRecord", "ResumeRecord", "ToggleRecordPause"):
+                pause = request_type == "PauseRecord" or (request_type == "ToggleRecordPause" and not state.paused)
+                changed = state.pause(pause)
+                output_state = "OBS_WEBSOCKET_OUTPUT_PAUSED" if pause else "OBS_WEBSOCKET_OUTPUT_RESUMED"
+                return None, {'outputActive': state.recording, 'outputState': output_state} if changed else None
+        if request_type == "GetVideoSettings":
+            return {'baseWidth': self.width, 'baseHeight': self.height, 'outputWidth': self.width, 'outputHeight': self.height,
+                    'fpsNumerator': self.fps, 'fpsDenominator': 1}, None
+        if request_type == "SetRecordDirectory":
+            self.record_directory = request_data.get('recordDirectory', "")
+            return None, None
+        if request_type == "GetCurrentProgramScene":
+            return {'currentProgramSceneName': "Scene", 'sceneName': "Scene"}, None
+        if request_type == "GetSourceScreenshot":
+            size = (request_data.get('imageWidth') or self.width, request_data.get('imageHeight') or self.height)
+            return {'imageData': self._screenshot(size)}, None
+        raise KeyError(request_type)
+
+    # Screenshots are generated once per size, the content doesn't matter for benchmarking
+    def _screenshot(self, size):
+        if size not in self._screenshots:
+            image = Image.linear_gradient("L").resize(size).convert("RGB")
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=10)
+            self._screenshots[size] = "data:image/jpg;base64," + base64.b64encode(buffer.getvalue()).decode()
+        return self._screenshots[size]
+
+    # Switch to a profile with a different frame rate, like changing profile in OBS, which pushes CurrentProfileChanged
+    def change_profile(self, fps):
+        self.fps = fps
+        self._broadcast(CONFIG_SUBSCRIPTION, "CurrentProfileChanged", {'profileName': f"Sim {fps} FPS"})
+
+    def _broadcast(self, subscription, event_type, event_data):
+        with self._connections_lock:
+            connections = [c for c in self._connections if c.identified and c.subscriptions & subscription]
+        for connection in connections:
+            try:
+                connection.send(5, {'eventType': event_type, 'eventIntent': subscription, 'eventData': event_data})
+            except OSError:
+                pass
+
+# A set of simulated devices, with a config in the same shape as config.yaml
+class SimulatorFleet:
+    def __init__(self, obs_count=0, hyperdeck_count=0, latency=0.0, jitter=0.0, failure_rate=0.0, seed=None):
+        self.obs = [MockObs(faults=FaultProfile(latency, jitter, failure_rate, seed=None if seed is None else seed + i))
+                    for i in range(obs_count)]
+        self.hyperdecks = [MockHyperDeck(faults=FaultProfile(latency, jitter, failure_rate, seed=None if seed is None else seed + obs_count + i))
+                           for i in range(hyperdeck_count)]
+
+    def start(self):
+        for device in self.obs + self.hyperdecks:
+            device.start()
+        return self
+
+    def stop(self):
+        for device in self.obs + self.hyperdecks:
+            device.stop()
+
+    def config(self):
+        return {
+            'obs_connections': [{'name': f"Sim OBS {i + 1}", 'host': device.host, 'port': device.port} for i, device in enumerate(self.obs)],
+            'blackmagic_connections': [{'name': f"Sim HyperDeck {i + 1}", 'host': device.host} for i, device in enumerate(self.hyperdecks)],
+        }
+
+    def change_profiles(self, fps):
+        for device in self.obs:
+            device.change_profile(fps)
+
+    def stats(self):
+        return {
+            'obs': [device.state.stats() for device in self.obs],
+            'hyperdecks': [device.state.stats() for device in self.hyperdecks],
+        }
+
+# Run a fleet in another process so it doesn't compete with the code being measured for the GIL.
+# Commands are sent over conn: "config" and "stats" reply with a dict, ("profile", fps) changes the
+# frame rate of every OBS and replies None, "stop" ends the process.
+def serve_fleet(conn, **fleet_args):
+    fleet = SimulatorFleet(**fleet_args).start()
+    try:
+        while True:
+            command = conn.recv()
+            if command == "stop":
+                break
+            elif command == "config":
+                conn.send(fleet.config())
+            elif command == "stats":
+                conn.send(fleet.stats())
+            elif command[0] == "profile":
+                fleet.change_profiles(command[1])
+                conn.send(None)
+    finally:
+        fleet.stop()
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="simulators", description="Run simulated OBS and HyperDeck devices for MultiRecorder.")
+    parser.add_argument('--obs', type=int, default=1, help='Number of simulated OBS instances.')
+    parser.add_argument('--hyperdecks', type=int, default=1, help='Number of simulated HyperDecks.')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every request.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Up to this many extra seconds added to every request.')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Fraction of requests that fail.')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--write-config', type=str, default=None, help='Write a MultiRecorder config for the fleet to this file.')
+    args = parser.parse_args()
+
+    fleet = SimulatorFleet(args.obs, args.hyperdecks, args.latency, args.jitter, args.failure_rate, args.seed).start()
+    config = fleet.config()
+    if args.write_config:
+        import yaml
+        with open(args.write_config, "w") as f:
+            yaml.safe_dump(config, f, sort_keys=False)
+        print(f"Wrote config to {args.write_config}")
+    for conn in config['obs_connections']:
+        print(f"{conn['name']}: ws://{conn['host']}:{conn['port']}")
+    for conn in config['blackmagic_connections']:
+        print(f"{conn['name']}: http://{conn['host']}/control/api/v1")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    fleet.stop()
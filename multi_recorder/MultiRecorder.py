@@ -1,41 +1,116 @@
-import argparse, base64, io, os, requests, time, yaml
-import dearpygui.dearpygui as dpg
-import obsws_python as obs
-from PIL import Image
+# Startup is timed from here, before anything else is imported
+import time
+launch_t0 = time.perf_counter()
+import argparse, os, queue, sys, yaml
+
+# Workers for --shards are started as this program in standalone builds, they skip the args and GUI entirely
+if len(sys.argv) == 4 and sys.argv[1] == "--shard-worker":
+    from sharded_manager import run_worker
+    run_worker(int(sys.argv[2]), int(sys.argv[3]))
+    sys.exit()
+
+# Heavier modules (dearpygui, previews with numpy and PIL, device clients with requests and obsws_python)
+# are imported where they're first needed, so startup only pays for what the config and args use
+from device_cards import CARD_TAGS, connection_status_text, describe_card, fps_text, resolution_text
+from device_manager import DeviceManager, DeviceSettings, preview_size
+from device_metadata import DeviceMetadata
+from instrumentation import METRICS, FrameProfiler, MetricsDumper, format_report
+from view_model import ViewModel
+from startup import StartupTimer
 
 # GUI Constants
 WHITE = [255,255,255,255]
 RED = [255,0,0,255]
 YELLOW = [255,255,0,255]
 GREEN = [0,200,0,255]
+COLORS = {'white': WHITE, 'red': RED, 'yellow': YELLOW, 'green': GREEN}
 TABLE_HEADER_COLOR = (38,72,125)
 TABLE_HEIGHT = 100
+INPUT_ACTIVE_SECONDS = 1 # How long after mouse or keyboard input the GUI keeps drawing at the target framerate
+GRID_THRESHOLD = 8 # Setups with more connections than this use the compact device grid by default
+GRID_FOOTER_HEIGHT = 170 # Room left under the device grid for Status & Settings
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets") # Next to this file, wherever it's launched from
 
 # Command line args
 parser = argparse.ArgumentParser(prog="MultiRecorder")
 parser.add_argument('-c','--config-file',help='The path to a configuration file.', required=False, type=str, default=r"config.yaml")
 parser.add_argument('-p','--show-previews',help='Whether the OBS connections should show an initial screenshot preview.', 
                     required=False, default=False, action='store_true')
+parser.add_argument('-pw','--preview-width',help='Width OBS previews are captured and decoded at, 0 keeps the full OBS resolution.', 
+                    required=False, type=int, default=400)
+parser.add_argument('-l','--live-previews',help='Whether OBS previews should keep refreshing after startup, implies --show-previews.', 
+                    required=False, default=False, action='store_true')
+parser.add_argument('-lr','--preview-rate',help='Live preview frames per second for each OBS connection, can be overridden per connection with preview_rate in the config.', 
+                    required=False, type=float, default=1)
+parser.add_argument('-lb','--preview-budget',help='Maximum live preview frames per second across all OBS connections.', 
+                    required=False, type=float, default=10)
 parser.add_argument('-f','--show-fps',help='Whether the GUI should display frames per sseond in its title.', 
                     required=False, default=False, action='store_true')
 parser.add_argument('-fps','--target-framerate',help='A target maximum framerate for the GUI.', required=False, type=int, default=60)
+parser.add_argument('-ifps','--idle-framerate',help='Framerate the GUI drops to while nothing changes and there is no input, status changes are still drawn immediately.', 
+                    required=False, type=float, default=10)
+parser.add_argument('-pi','--poll-interval',help='Seconds between status polls for a device that is recording, can be overridden per connection with poll_interval in the config.', 
+                    required=False, type=float, default=0.1)
+parser.add_argument('-ipi','--idle-poll-interval',help='Seconds between status polls for a device that is not recording, can be overridden per connection with idle_poll_interval in the config.', 
+                    required=False, type=float, default=1)
+parser.add_argument('-mb','--max-backoff',help='Maximum seconds between reconnect attempts for an unreachable device.', 
+                    required=False, type=float, default=30)
+parser.add_argument('-r','--obs-resync-interval',help='Seconds between full OBS status requests, state changes arrive through OBS events in between.', 
+                    required=False, type=float, default=5)
+parser.add_argument('-m','--metadata-ttl',help='Seconds before cached device info (resolution, framerate, codec, input) is fetched again.', 
+                    required=False, type=float, default=60)
+parser.add_argument('-t','--startup-timeout',help='Seconds to wait for all devices to connect at startup, devices that take longer are reported as failed.', 
+                    required=False, type=float, default=5)
+parser.add_argument('--shards',help='Split the devices across this many worker processes, each owning the connections for its share of the config. 1 runs everything in this process.', 
+                    required=False, type=int, default=1)
+parser.add_argument('--layout',help='cards shows a table (and preview) per device, grid shows a compact, filterable row per device. auto picks grid for more than 8 connections.', 
+                    required=False, type=str, choices=("auto", "cards", "grid"), default="auto")
 parser.add_argument('-d','--record-directory',help='Whether the GUI should show the record directory input.', 
                     required=False, default=False, action='store_true')
+parser.add_argument('--headless',help='Run without the GUI, devices are controlled through the control API instead.', 
+                    required=False, default=False, action='store_true')
+parser.add_argument('--api-host',help='Address the control API listens on.', required=False, type=str, default="127.0.0.1")
+parser.add_argument('--api-port',help='Port for the control API. Always served when headless (default 8765), only served with the GUI if set.', 
+                    required=False, type=int, default=None)
+parser.add_argument('--metrics-file',help='Periodically write request latencies, errors and frame times to this file, as Prometheus text if it ends in .prom or .txt and JSON otherwise.', 
+                    required=False, type=str, default=None)
+parser.add_argument('--config-poll-interval',help='Seconds between checks of the config file for changes, which are applied without restarting. 0 turns this off.', 
+                    required=False, type=float, default=1)
+parser.add_argument('--journal-dir',help='Write a journal of every device starting, pausing and stopping recording, timecodes and dropouts to a new file in this directory. Summarize it with journal_summary.py.', 
+                    required=False, type=str, default=None)
+parser.add_argument('--metrics-interval',help='Seconds between writes to the metrics file.', required=False, type=float, default=10)
+parser.add_argument('--exit-after-startup',help='Exit once started, after the first frame or once connected when headless. For measuring startup time.', 
+                    required=False, default=False, action='store_true')
 args = parser.parse_args()
 
 # Timing Stuff
 frame_frequency = 1/args.target_framerate
 timing_t0 = time.perf_counter()
 timing_counter = timing_t0
+startup_timer = StartupTimer(launch_t0)
+startup_timer.mark("imports and args")
+
+# A relative config path that isn't found from the working directory is looked for next to this file,
+# so launching from elsewhere (e.g. Run MultiRecorder.bat) still finds the bundled config
+if not os.path.exists(args.config_file) and not os.path.isabs(args.config_file):
+    bundled_config = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.config_file)
+    if os.path.exists(bundled_config):
+        args.config_file = bundled_config
 
 if not os.path.exists(args.config_file):
     raise FileNotFoundError(f"Configuration file '{args.config_file}' not found. Make sure it exists and is spelled correctly.")
 else:
     print(f"Config from args: {args.config_file}")
 
-show_previews = args.show_previews
+headless = args.headless
+print(f"Headless: {headless}")
+
+show_previews = (args.show_previews or args.live_previews) and not headless
 print(f"Show Previews: {show_previews}")
 
+live_previews = args.live_previews and not headless
+print(f"Live Previews: {live_previews}")
+
 show_fps = args.show_fps
 print(f"Show FPS: {show_fps}")
 
@@ -50,92 +125,43 @@ def load_config_yaml(file_path):
     except Exception as e:
         print(f"Error loading {file_path}: {e}")
         return None
-    
-# Decode base64 string to array that can be used in dearpygui
-def decode_base64_to_image(base64_string):
-    # Decode base64 string into bytes
-    image_bytes = base64.b64decode(base64_string)
-
-    # Create PIL Image object from bytes
-    image = Image.open(io.BytesIO(image_bytes))
-
-    # Convert PIL Image to list of tuples
-    image_list = list(image.getdata())
-
-    # Add alpha channel to image_list by appending 255 to each tuple
-    alpha_image_list = [(r, g, b, 255) for r, g, b in image_list]
 
-    # Flatten the list and convert the values to floats in the range 0-1
-    image_list_1d = [float(i)/255 for sublist in alpha_image_list for i in sublist]
-
-    return image_list_1d
-
-# Currently doesn't work
-def update_screenshot_callback(sender, app_data, user_data):
-    program_scene = user_data.get_current_program_scene()
-    texture_data = decode_base64_to_image(user_data.get_source_screenshot(name=program_scene.current_program_scene_name, img_format='jpg', width=user_data.get_video_settings().base_width, height=user_data.get_video_settings().base_height, quality=10).image_data.replace('data:image/jpg;base64,', ''))
-    dpg.configure_item(f"{user_data.get_host()}_{user_data.get_port()}_preview", default_value=texture_data)
-    
-# Toggle recording for OBS connection
-def obs_record_toggle_callback(sender, app_data, user_data):
-    user_data.toggle_record()
+# Toggle recording for a connection
+def record_toggle_callback(sender, app_data, user_data):
+    user_data.toggle_recording()
 
 # Pause/unpause recording for OBS connection
 def obs_pause_toggle_callback(sender, app_data, user_data):
-    user_data.toggle_record_pause()
-    
-# Toggle recording for BlackMagic connection
-def bm_record_toggle_callback(sender, app_data, user_data):
-    recording = requests.get(url=f"http://{user_data}/control/api/v1/transports/0/record").json().get('recording')
-    requests.put(url=f"http://{user_data}/control/api/v1/transports/0/record", json={'recording': not recording})
+    user_data.toggle_pause()
 
 # Start recording for all connections
 def record_all_callback(sender, app_data, user_data):
-    for client in obs_active_clients:
-        status = client.get_record_status()
-        is_recording = status.output_active
-        if not is_recording:
-            client.start_record()
-    for conn in blackmagic_active_conns:
-        recording = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/record").json().get('recording')
-        if not recording:
-            requests.put(url=f"http://{conn['host']}/control/api/v1/transports/0/record", json={'recording': True})
+    manager.record_all()
 
 # Stop recording for all connections
 def stop_all_callback(sender, app_data, user_data):
-    for client in obs_active_clients:
-        status = client.get_record_status()
-        is_recording = status.output_active
-        if is_recording:
-            client.stop_record()
-    for conn in blackmagic_active_conns:
-        recording = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/record").json().get('recording')
-        if recording:
-            requests.put(url=f"http://{conn['host']}/control/api/v1/transports/0/record", json={'recording': False})
-
-# Set the directory for recordings
+    manager.stop_all()
+
+# Refetch cached device info for all connections on their next poll
+def refresh_device_info_callback(sender, app_data, user_data):
+    manager.refresh_metadata()
+
+# Get every connection ready to record into the entered directory, OBS records into a folder per
+# connection under it and BlackMagic clips are named after it
 def set_record_directory_callback(sender, app_data, user_data):
-    success = True
     record_dir = dpg.get_value("record_dir")
+    if not record_dir:
+        return
+    results = manager.prepare_recording(record_dir)
+    failed = [result for result in results if not result.ok]
     
-    # Create directory for each OBS connection
-    for client in obs_active_clients:
-        conn = obs_active_conns[obs_active_clients.index(client)]
-        directory_path = f"{record_dir}\\video\\{conn['name']}"
-        try:
-            if not os.path.exists(directory_path):
-                os.makedirs(directory_path)
-        except Exception as e:
-            print(f"Failed to create directory: {e}")
-            success = False
-        client.set_record_directory(directory_path)
-
-    # Set directory for each BlackMagic connection - Not yet sure if this is possible with current setup
-    # for conn in blackmagic_active_conns:
-    #     requests.put(url=f"http://{conn['host']}/control/api/v1/transports/0/clip", json={'clip': {'name': record_dir}})
-
     # Confirm directory was set
-    if success:
+    status = f"{len(results) - len(failed)} ready"
+    if failed:
+        status += f", {len(failed)} failed: " + ", ".join(result.name for result in failed)
+    dpg.set_value("record_dir_status", status)
+    dpg.configure_item("record_dir_status", color=RED if failed else GREEN, show=True)
+    if not failed:
         dpg.set_value("record_dir", "")
         dpg.configure_item("record_dir", hint=f"{record_dir}")
 
@@ -146,94 +172,125 @@ except Exception as e:
     print("Failed to load config: ", e)
     exit()
 
-# Track failed connections to notify user
-conn_failed = False
-failed_conns = []
-
-# Establish connections to OBS instances, track whether each connection was successful
-obs_connections = cfg['obs_connections']
-if obs_connections is None or len(obs_connections) == 0:
-    print("No OBS connections found in config.")
-    obs_empty = True
+# Large setups get the compact device grid, a table per device only fits a handful on screen
+configured_conns = len(cfg.get('obs_connections') or []) + len(cfg.get('blackmagic_connections') or [])
+use_grid = not headless and (args.layout == "grid" or (args.layout == "auto" and configured_conns > GRID_THRESHOLD))
+if use_grid:
+    print(f"Using the device grid for {configured_conns} connections, previews are only shown with --layout cards")
+    show_previews = live_previews = False
+
+# Previews need the OBS connection, which lives in a worker process when sharding
+if args.shards > 1 and show_previews:
+    print("Previews aren't available with --shards, they've been turned off")
+    show_previews = live_previews = False
+
+startup_timer.mark("load config")
+
+# Connect to every device, the device manager keeps their status current from here on
+settings = DeviceSettings(
+    startup_timeout=args.startup_timeout,
+    obs_resync_interval=args.obs_resync_interval,
+    metadata_ttl=args.metadata_ttl,
+    poll_interval=args.poll_interval,
+    idle_poll_interval=args.idle_poll_interval,
+    max_backoff=args.max_backoff,
+    capture_previews=show_previews,
+    preview_width=args.preview_width)
+if args.shards > 1:
+    from sharded_manager import ShardedDeviceManager
+    manager = ShardedDeviceManager(settings, shards=args.shards)
+else:
+    manager = DeviceManager(settings)
+manager.connect(cfg)
+# Connections that failed are retried in the background, the GUI adds them like a config reload once they connect
+config_changes = queue.SimpleQueue()
+if not headless:
+    manager.on_change = config_changes.put
+manager.start()
+
+# Journal what the devices do for syncing footage and reviewing incidents afterwards
+if args.journal_dir:
+    from session_journal import SessionJournal
+    journal_path = os.path.join(args.journal_dir, time.strftime("multirecorder_%Y%m%d_%H%M%S.journal"))
+    manager.journal = SessionJournal(manager, journal_path)
+    manager.journal.start()
+    print(f"Writing session journal to {journal_path}")
+startup_timer.mark("connect, probe and preview")
+
+conn_failed = len(manager.failed_conns) > 0
+obs_empty = len(manager.obs_devices) == 0
+blackmagic_empty = len(manager.blackmagic_devices) == 0
+
+# Apply changes to the config file while running, only the connections that changed are touched and
+# the render loop rebuilds just their widgets
+def reload_config():
+    new_cfg = load_config_yaml(args.config_file)
+    if new_cfg is None:
+        print("Keeping the current connections")
+        return
+    changes = manager.apply_config(new_cfg)
+    if changes is not None and not headless:
+        config_changes.put(changes)
+
+if args.config_poll_interval > 0:
+    from config_watcher import ConfigWatcher
+    config_watcher = ConfigWatcher(args.config_file, reload_config, interval=args.config_poll_interval)
+    config_watcher.start()
+else:
+    config_watcher = None
+
+# Serve the control API for scripts and other operators
+api_port = args.api_port if args.api_port is not None or not headless else 8765
+if api_port is not None:
+    from control_api import ControlApiServer
+    control_api = ControlApiServer(manager, host=args.api_host, port=api_port)
+    control_api.start()
+    print(f"Control API listening on {control_api.address}")
 else:
-    obs_empty = False
-obs_active_clients = []
-obs_client_previews = []
-obs_active_conns = []
-
-if not obs_empty:
-    for conn in obs_connections:
-        try:
-            # Check if host and port are the same as a previous connection
-            if any(c['host'] == conn['host'] and c['port'] == conn['port'] for c in obs_active_conns):
-                print(f"Duplicate OBS connections in config @ {conn['host']}:{conn['port']}, only one connection will be established.")
-                continue
-            
-            client = obs.ReqClient(host=conn['host'], port=conn['port'], timeout=1)
-            obs_active_clients.append(client)
-            obs_active_conns.append(conn)
-            print(f"Successfully connected to {conn['name']} @ {conn['host']}:{conn['port']}")
-        except Exception as e:
-            failed_conns.append(conn)
-            print(f"Failed to connect to {conn['name']} @ {conn['host']}:{conn['port']}")
-            conn_failed = True
-            pass
-
-    if obs_active_clients is None or len(obs_active_clients) == 0:
-        print("All OBS connections failed.")
-        obs_empty = True
-
-# Establish connection to BlackMagic devices, track whether each connection was successful
-blackmagic_connections = cfg['blackmagic_connections']
-if blackmagic_connections is None or len(blackmagic_connections) == 0:
-    print("No BlackMagic connections found in config.")
-    blackmagic_empty = True
+    control_api = None
+
+# Dump metrics for anything watching from outside, mostly useful headless
+if args.metrics_file:
+    metrics_dumper = MetricsDumper(args.metrics_file, interval=args.metrics_interval)
+    metrics_dumper.start()
+    print(f"Writing metrics to {args.metrics_file} every {args.metrics_interval}s")
 else:
-    blackmagic_empty = False
-blackmagic_client_previews = []
-blackmagic_active_conns = []
-
-if not blackmagic_empty:
-    for conn in blackmagic_connections:
-        try:
-            # Check if host is the same as a previous connection
-            if any(c['host'] == conn['host'] for c in blackmagic_active_conns):
-                print(f"Duplicate BlackMagic connections in config @ {conn['host']}, only one connection will be established.")
-                continue
-
-            requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/record").json().get('recording')
-            blackmagic_active_conns.append(conn)
-            print(f"Successfully connected to {conn['name']} at {conn['host']}")
-        except Exception as e:
-            print(e)
-            failed_conns.append(conn)
-            print(f"Failed to connect to {conn['name']} at {conn['host']}")
-            conn_failed = True
-            pass
-
-    if blackmagic_active_conns is None or len(blackmagic_active_conns) == 0:
-        print("All BlackMagic connections failed.")
-        blackmagic_empty = True
-
-# Count the number of active connections and the number of connections currently recording
-num_active_conns = len(obs_active_clients) + len(blackmagic_active_conns)
-num_recording_conns = 0
-for client in obs_active_clients:
-    if client.get_record_status().output_active:
-        num_recording_conns += 1
-for conn in blackmagic_active_conns:
-    if requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/record").json().get('recording'):
-        num_recording_conns += 1
+    metrics_dumper = None
+
+# Headless, there's nothing to render so just keep the device manager and control API running
+if headless:
+    startup_timer.print_report(manager.startup_results)
+    try:
+        while not args.exit_after_startup:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    if config_watcher is not None:
+        config_watcher.stop()
+    control_api.stop()
+    if metrics_dumper is not None:
+        metrics_dumper.stop()
+    if manager.journal is not None:
+        manager.journal.stop()
+    manager.close()
+    sys.exit()
+
+import dearpygui.dearpygui as dpg
+if show_previews:
+    from previews import PREVIEW_WIDTH, LivePreviewer, capture_preview
 
 # Set up the GUI
-if len(obs_active_clients) > len(blackmagic_active_conns):
-    greatest_conns = len(obs_active_clients)
+if len(manager.obs_devices) > len(manager.blackmagic_devices):
+    greatest_conns = len(manager.obs_devices)
 else:
-    greatest_conns = len(blackmagic_active_conns)
+    greatest_conns = len(manager.blackmagic_devices)
 
 if obs_empty and blackmagic_empty:
     app_width  = 500
     app_height = 500
+elif use_grid:
+    app_width = 900
+    app_height = 640
 else:
     if show_previews:
         app_width = (greatest_conns * 430) - ((greatest_conns-1) * 20)
@@ -245,8 +302,151 @@ fail_modal_height = app_height - 80
 fail_modal_width = app_width - 80
 
 dpg.create_context()
+
+# The render loop describes every widget through the view model, which only passes on real changes
+view = ViewModel(dpg.set_value, dpg.configure_item, lock=dpg.mutex)
+
+if use_grid:
+    from device_grid import DeviceGrid
+    device_grid = DeviceGrid(manager, view, COLORS, record_callback=record_toggle_callback, pause_callback=obs_pause_toggle_callback)
+else:
+    device_grid = None
+
+# Table for one OBS connection in the OBS tab, with its preview if previews are shown
+def add_obs_card(device):
+    key = device.key
+    metadata = device.metadata.peek() or DeviceMetadata()
+
+    if show_previews:
+        with dpg.texture_registry(show=False):
+            preview = device.preview
+            dpg.add_dynamic_texture(width=preview.width, height=preview.height, default_value=preview.data, tag=f"{key}_preview", label=f"{device.name}_preview")
+
+    with dpg.group(tag=f"card_{key}", parent="obs_cards"):
+        with dpg.table(header_row=True, resizable=False, width=400, height=TABLE_HEIGHT, 
+                        borders_innerH=True, borders_outerH=True, borders_innerV=True, borders_outerV=True):
+            dpg.add_table_column(label=device.name, tag=f"name_{key}")
+            dpg.add_table_column(label=device.address)
+            with dpg.table_row():
+                dpg.add_text(resolution_text(metadata), tag=f"resolution_{key}")
+                dpg.add_text(fps_text(metadata), tag=f"fps_{key}")
+            with dpg.table_row():
+                dpg.add_text("Error!", tag=f"recording_pause_status_{key}")
+                dpg.add_button(label="Pause/Resume", tag=f"toggle_recording_pause_{key}", width=-1, callback=obs_pause_toggle_callback, user_data=device)
+            with dpg.table_row():
+                dpg.add_text("Error!", tag=f"recording_status_{key}")
+                dpg.add_button(label="Toggle Recording", tag=f"toggle_recording_{key}", width=-1, callback=record_toggle_callback, user_data=device)
+            with dpg.table_row():
+                dpg.add_text("Recording Length:")
+                dpg.add_text("00:00:00.000", tag=f"time_{key}")
+        if show_previews:
+            aspect_ratio = metadata.aspect_ratio
+            dpg.add_image(f"{key}_preview", width=PREVIEW_WIDTH, height=PREVIEW_WIDTH * aspect_ratio)
+
+# Table for one BlackMagic connection in the BlackMagic tab
+def add_blackmagic_card(device):
+    key = device.key
+    metadata = device.metadata.peek() or DeviceMetadata()
+    if metadata.resolution is None or metadata.fps is None or metadata.codec is None:
+        print(f"Failed to get {device.name} video format.")
+        print(f"This is likely because the BlackMagic device isn't receiving any input.")
+
+    with dpg.table(tag=f"card_{key}", parent="blackmagic_cards", header_row=True, resizable=False, width=400, height=TABLE_HEIGHT, 
+                borders_innerH=True, borders_outerH=True, borders_innerV=True, borders_outerV=True):
+        dpg.add_table_column(label=device.name, tag=f"name_{key}")
+        dpg.add_table_column(label=device.address)
+        with dpg.table_row():
+            dpg.add_text(resolution_text(metadata), tag=f"resolution_{key}")
+            dpg.add_text(fps_text(metadata), tag=f"fps_{key}")
+
+        with dpg.table_row():
+            dpg.add_text(f"{metadata.input_source or 'Error!'}", tag=f"input_source_{key}")
+            dpg.add_text(f"{metadata.codec or 'Error!'}", tag=f"codec_{key}")
+
+        with dpg.table_row():
+            dpg.add_text("Error!", tag=f"recording_status_{key}")
+            dpg.add_button(label="Toggle Recording", tag=f"toggle_recording_{key}", width=-1,
+                        callback=record_toggle_callback, user_data=device)
+        with dpg.table_row():
+            dpg.add_text("Recording Length:")
+            dpg.add_text("00:00:00", tag=f"time_{key}")
+
+def remove_card(device):
+    key = device.key
+    if previewer is not None:
+        previewer.remove_source(f"{key}_preview")
+    for tag in CARD_TAGS:
+        view.invalidate(f"{tag}_{key}")
+    for tag in (f"card_{key}", f"{key}_preview"):
+        if dpg.does_item_exist(tag):
+            dpg.delete_item(tag)
+
+# Blank tab button that pushes Record All and Stop All to the right, sized for the tabs shown
+def tab_spacer_label(obs_empty, blackmagic_empty):
+    if device_grid is not None:
+        return "                             "
+    elif not obs_empty and not blackmagic_empty:
+        return "           "
+    elif not obs_empty and blackmagic_empty:
+        return "                      "
+    elif obs_empty and not blackmagic_empty:
+        return "               "
+    return ""
+
+# Keep live previews for an OBS connection refreshing in the background
+def add_preview_source(device):
+    previewer.add_source(f"{device.key}_preview", lambda device=device: capture_preview(device.state.client, *preview_size(device.metadata.get(), args.preview_width)),
+                         rate=device.conn.get('preview_rate', args.preview_rate), width=device.preview.width, height=device.preview.height)
+
+# Contents of the Connections Failed modal
+def list_connection_failures(failed_conns):
+    dpg.add_text("The following failed to connect:", parent="connection_fail")
+    for conn in failed_conns:
+        if conn in manager.obs_connections:
+            dpg.add_text(f" - {conn['name']} - {conn['host']}:{conn['port']}", parent="connection_fail")
+        else:
+            dpg.add_text(f" - {conn['name']} - {conn['host']}", parent="connection_fail")
+    dpg.add_text("They'll keep being retried in the background.", parent="connection_fail")
+    dpg.add_text("Make sure the config file is correct.", parent="connection_fail")
+    dpg.add_text("OBS: Make sure WebSocket is configured.", parent="connection_fail")
+    dpg.add_text("BlackMagic: Make sure remote is enabled.", parent="connection_fail")
+    dpg.add_text("BlackMagic: Check input is working.", parent="connection_fail")
+
+# Rebuild the widgets of the connections a config reload changed, the rest are left alone
+def apply_config_changes(changes):
+    global card_obs_devices, card_blackmagic_devices, rendered_store_version
+    if device_grid is not None:
+        device_grid.devices_changed()
+    else:
+        for device in changes.removed:
+            remove_card(device)
+        for device in changes.updated:
+            if dpg.does_item_exist(f"name_{device.key}"):
+                dpg.configure_item(f"name_{device.key}", label=device.name)
+            # Picks up a changed preview_rate, a rate of 0 or less stops the live preview
+            if previewer is not None and device.kind == "obs":
+                add_preview_source(device)
+        for device in changes.added:
+            if device.kind == "obs":
+                add_obs_card(device)
+                if previewer is not None:
+                    add_preview_source(device)
+            else:
+                add_blackmagic_card(device)
+        card_obs_devices = [device for device in manager.obs_devices if dpg.does_item_exist(f"card_{device.key}")]
+        card_blackmagic_devices = [device for device in manager.blackmagic_devices if dpg.does_item_exist(f"card_{device.key}")]
+        dpg.configure_item("obs_tab", show=bool(card_obs_devices))
+        dpg.configure_item("blackmagic_tab", show=bool(card_blackmagic_devices))
+        dpg.configure_item("tab_spacer", label=tab_spacer_label(not card_obs_devices, not card_blackmagic_devices))
+    # Connections the reload added that couldn't connect get the same notice as at startup
+    if changes.failed:
+        dpg.delete_item("connection_fail", children_only=True)
+        list_connection_failures(changes.failed)
+        dpg.configure_item("connection_fail", show=True)
+    rendered_store_version = None
+
 with dpg.font_registry():
-    default_font = dpg.add_font(r"assets\B612Mono-Regular.ttf", 14)
+    default_font = dpg.add_font(os.path.join(ASSETS_DIR, "B612Mono-Regular.ttf"), 14)
 
 # Theme - Taken from GCS Exec
 with dpg.theme() as global_theme:
@@ -263,131 +463,41 @@ with dpg.theme() as tab_spacer:
         dpg.add_theme_color(dpg.mvThemeCol_Tab, [0,0,0,0], category=dpg.mvThemeCat_Core)
         dpg.add_theme_color(dpg.mvThemeCol_TabHovered, [0,0,0,0], category=dpg.mvThemeCat_Core)
 
-# Get an initial screenshot for each connected OBS instance, useful for confirming it's recording the correct thing
-if show_previews and not obs_empty:
-    for client in obs_active_clients:
-        program_scene = client.get_current_program_scene()
-        texture_data = decode_base64_to_image(client.get_source_screenshot(name=program_scene.current_program_scene_name, img_format='jpg', width=client.get_video_settings().base_width, height=client.get_video_settings().base_height, quality=10).image_data.replace('data:image/jpg;base64,', ''))
-        obs_client_previews.append(texture_data)
-
 with dpg.window(tag="Primary Window"):
     dpg.bind_font(default_font)
 
     # Notify user which connections failed, if any
     with dpg.window(label="Connections Failed", modal=True, show=conn_failed, tag="connection_fail",
                      width=fail_modal_width, height=fail_modal_height, pos=(30,20)):
-        dpg.add_text("The following failed to connect:")
-        for conn in failed_conns:
-            if not obs_empty and conn in obs_connections:
-                dpg.add_text(f" - {conn['name']} - {conn['host']}:{conn['port']}")
-            else:
-                dpg.add_text(f" - {conn['name']} - {conn['host']}")
-        dpg.add_text("Make sure the config file is correct.")
-        dpg.add_text("OBS: Make sure WebSocket is configured.")
-        dpg.add_text("BlackMagic: Make sure remote is enabled.")
-        dpg.add_text("BlackMagic: Check input is working.")
+        list_connection_failures(manager.failed_conns)
         # dpg.add_button(label="Close", width=-1, height=50, callback=lambda: dpg.configure_item("connection_fail", show=False))
     
     with dpg.tab_bar(tag="tab_bar", reorderable=True):
 
-        if not obs_empty:
-            with dpg.tab(label="OBS", order_mode=dpg.mvTabOrder_Reorderable):
-                with dpg.group(horizontal=show_previews):
-                    for client in obs_active_clients:
-                        conn = obs_active_conns[obs_active_clients.index(client)]
-
-                        if show_previews:
-                            with dpg.texture_registry(show=False):
-                                dpg.add_dynamic_texture(width=client.get_video_settings().base_width, height=client.get_video_settings().base_height, default_value=obs_client_previews[obs_active_clients.index(client)], tag=f"{conn}_preview", label=f"{conn}_preview")
-                    
-                        with dpg.group():
-                            with dpg.table(header_row=True, resizable=False, width=400, height=TABLE_HEIGHT, 
-                                            borders_innerH=True, borders_outerH=True, borders_innerV=True, borders_outerV=True):
-                                dpg.add_table_column(label=conn['name'])
-                                dpg.add_table_column(label=f'{conn["host"]}:{conn["port"]}')
-                                with dpg.table_row():
-                                    dpg.add_text(f"{client.get_video_settings().base_width}x{client.get_video_settings().base_height}")
-                                    dpg.add_text(f"Error!", tag=f"fps_{conn}")
-                                with dpg.table_row():
-                                    dpg.add_text("Error!", tag=f"recording_pause_status_{conn}")
-                                    dpg.add_button(label="Pause/Resume", tag=f"toggle_recording_pause_{conn}", width=-1, callback=obs_pause_toggle_callback, user_data=client)
-                                with dpg.table_row():
-                                    dpg.add_text("Error!", tag=f"recording_status_{conn}")
-                                    dpg.add_button(label="Toggle Recording", tag=f"toggle_recording_{conn}", width=-1, callback=obs_record_toggle_callback, user_data=client)
-                                with dpg.table_row():
-                                    dpg.add_text("Recording Length:")
-                                    dpg.add_text("00:00:00.000", tag=f"time_{conn}")
-                            if show_previews:
-                                aspect_ratio = client.get_video_settings().base_height / client.get_video_settings().base_width
-                                dpg.add_image(f"{conn}_preview", width=400, height=400 * aspect_ratio)
-                                # dpg.add_image_button(f"{conn}_preview", width=392, height=392 * aspect_ratio, callback=update_screenshot_callback, user_data=client)
-
-        if not blackmagic_empty:
-            with dpg.tab(label="BlackMagic", order_mode=dpg.mvTabOrder_Reorderable):
-                for conn in blackmagic_active_conns:
-
-                    with dpg.table(header_row=True, resizable=False, width=400, height=TABLE_HEIGHT, 
-                                borders_innerH=True, borders_outerH=True, borders_innerV=True, borders_outerV=True):
-                        dpg.add_table_column(label=conn['name'])
-                        dpg.add_table_column(label=conn['host'])
-                        with dpg.table_row():
-                            clip = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/clip").json()
-                            try:
-                                dpg.add_text(f"{clip.get('clip').get('videoFormat').get('width')}x{clip.get('clip').get('videoFormat').get('height')}")
-                            except Exception as e:
-                                dpg.add_text("Error!")
-                                print(f"Failed to get {conn['name']} resolution: {e}")
-                                print(f"This is likely because the BlackMagic device isn't receiving any input.")
-
-                            try:
-                                dpg.add_text(f"{clip.get('clip').get('videoFormat').get('frameRate')}.0 FPS")
-                            except Exception as e:
-                                dpg.add_text("Error!")
-                                print(f"Failed to get {conn['name']} framerate: {e}")
-                                print(f"This is likely because the BlackMagic device isn't receiving any input.")
-
-                        with dpg.table_row():
-                            input_source = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/inputVideoSource").json()
-                            try:
-                                dpg.add_text(f"{input_source.get('inputVideoSource')}", tag=f"input_source_{conn}")
-                            except Exception as e:
-                                dpg.add_text("Error!")
-                                print(f"Failed to get {conn['name']} input source: {e}")
-                                print(f"This is likely because the BlackMagic device isn't receiving any input.")
-
-                            try:
-                                dpg.add_text(clip.get('clip').get('codecFormat').get('codec'), tag=f"codec_{conn}")
-                            except Exception as e:
-                                dpg.add_text("Error!")
-                                print(f"Failed to get {conn['name']} codec: {e}")
-                                print(f"This is likely because the BlackMagic device isn't receiving any input.")
-                                
-                        with dpg.table_row():
-                            dpg.add_text("Error!", tag=f"recording_status_{conn}")
-                            dpg.add_button(label="Toggle Recording", tag=f"toggle_recording_{conn}", width=-1,
-                                        callback=bm_record_toggle_callback, user_data=conn['host'])
-                        with dpg.table_row():
-                            dpg.add_text("Recording Length:")
-                            dpg.add_text("00:00:00", tag=f"time_{conn}")
-
-        if not obs_empty and not blackmagic_empty:
-            dpg.add_tab_button(label="           ", tag="tab_spacer")
-        elif not obs_empty and blackmagic_empty:
-            dpg.add_tab_button(label="                      ", tag="tab_spacer")
-        elif obs_empty and not blackmagic_empty:
-            dpg.add_tab_button(label="               ", tag="tab_spacer")
-        else:
-            dpg.add_tab_button(label="", tag="tab_spacer")
+        if device_grid is not None:
+            with dpg.tab(label="Devices", order_mode=dpg.mvTabOrder_Reorderable):
+                device_grid.build(height=-GRID_FOOTER_HEIGHT)
+
+        if device_grid is None:
+            with dpg.tab(label="OBS", tag="obs_tab", show=not obs_empty, order_mode=dpg.mvTabOrder_Reorderable):
+                dpg.add_group(horizontal=show_previews, tag="obs_cards")
+                for device in manager.obs_devices:
+                    add_obs_card(device)
+
+            with dpg.tab(label="BlackMagic", tag="blackmagic_tab", show=not blackmagic_empty, order_mode=dpg.mvTabOrder_Reorderable):
+                dpg.add_group(tag="blackmagic_cards")
+                for device in manager.blackmagic_devices:
+                    add_blackmagic_card(device)
+
+        dpg.add_tab_button(label=tab_spacer_label(obs_empty, blackmagic_empty), tag="tab_spacer")
         dpg.bind_item_theme("tab_spacer", tab_spacer)
         dpg.add_tab_button(label="Record All", trailing=True, callback=record_all_callback)
         dpg.add_tab_button(label="Stop All",   trailing=True, callback=stop_all_callback)
 
     with dpg.tree_node(label="Status & Settings", default_open=True):
-        if num_active_conns == 1:
-            dpg.add_text(f"{num_active_conns} connection, {num_recording_conns} recording", tag="connection_status", show=not conn_failed)
-        else:
-            dpg.add_text(f"{num_active_conns} connections, {num_recording_conns} recording", tag="connection_status", show=not conn_failed)
+        dpg.add_text(connection_status_text(manager.store.counts()), tag="connection_status", show=not conn_failed)
 
+        dpg.add_button(label="Refresh Device Info", width=196, callback=refresh_device_info_callback)
         dpg.add_slider_int(label="GUI Target Framerate", width=196, default_value=args.target_framerate, min_value=10, max_value=60, tag="target_framerate")
 
         if record_directory:
@@ -397,19 +507,51 @@ with dpg.window(tag="Primary Window"):
                 with dpg.table_row():
                     dpg.add_input_text(hint="Record Directory", width=-1, tag="record_dir")
                     dpg.add_button(label="Enter", width=-1, callback=set_record_directory_callback)
+            dpg.add_text("", tag="record_dir_status", show=False)
+
+        # Request latencies and frame times, only refreshed while expanded
+        with dpg.collapsing_header(label="Diagnostics", default_open=False):
+            dpg.add_text("", tag="diagnostics")
+
+startup_timer.mark("build gui")
 
 dpg.setup_dearpygui()
 dpg.create_viewport(title="MultiRecorder",
     width=app_width,
     height=app_height,
     vsync=False,
-    resizable=False,
-    small_icon = r"assets\icon.ico",
-    large_icon = r"assets\icon.ico",
-    max_height=app_width + 50,
-    max_width=app_height + 50,
-    min_width=app_width,
-    min_height=app_height,)
+    resizable=True,
+    small_icon = os.path.join(ASSETS_DIR, "icon.ico"),
+    large_icon = os.path.join(ASSETS_DIR, "icon.ico"),
+    min_width=min(app_width, 430),
+    min_height=min(app_height, 300),)
+
+# Keep previews refreshing in the background, frames are swapped into the preview textures by the render loop
+if live_previews:
+    previewer = LivePreviewer(max_total_fps=args.preview_budget, max_workers=max(1, min(8, len(manager.obs_devices))))
+    for device in manager.obs_devices:
+        add_preview_source(device)
+    previewer.start()
+else:
+    previewer = None
+
+rendered_store_version = None
+card_obs_devices = manager.obs_devices
+card_blackmagic_devices = manager.blackmagic_devices
+profiler = FrameProfiler()
+diagnostics_updated = 0.0
+last_input = time.perf_counter()
+
+# Any mouse or keyboard input keeps the GUI at the target framerate for a moment
+def input_callback(sender, app_data):
+    global last_input
+    last_input = time.perf_counter()
+
+with dpg.handler_registry():
+    dpg.add_mouse_move_handler(callback=input_callback)
+    dpg.add_mouse_click_handler(callback=input_callback)
+    dpg.add_mouse_wheel_handler(callback=input_callback)
+    dpg.add_key_press_handler(callback=input_callback)
 
 dpg.show_viewport()
 # dpg.show_style_editor()
@@ -418,88 +560,81 @@ dpg.set_primary_window("Primary Window", True)
 while dpg.is_dearpygui_running():
     if show_fps:
         dpg.set_viewport_title(title=f"MultiRecorder - {dpg.get_frame_rate()} fps")
-
-    if not obs_empty:
-        for client in obs_active_clients:
-            conn = obs_active_conns[obs_active_clients.index(client)]
-            try:
-                status = client.get_record_status()
-                is_recording = status.output_active
-                is_paused = client.get_record_status().output_paused
-
-                dpg.set_value(f"fps_{conn}", f"{client.get_video_settings().fps_numerator / client.get_video_settings().fps_denominator} FPS")
-
-                if is_recording:
-                    dpg.set_value(f"recording_status_{conn}", "Recording")
-                    dpg.configure_item(f"recording_status_{conn}", color=GREEN)
-                    if is_paused:
-                        dpg.set_value(f"recording_pause_status_{conn}", "Paused")
-                        dpg.configure_item(f"recording_pause_status_{conn}", color=YELLOW)
-                    else:
-                        dpg.set_value(f"recording_pause_status_{conn}", "Not Paused")
-                        dpg.configure_item(f"recording_pause_status_{conn}", color=GREEN)
-                        dpg.set_value(f"time_{conn}", f"{status.output_timecode}")
-                else:
-                    dpg.set_value(f"recording_status_{conn}", "Not Recording")
-                    dpg.configure_item(f"recording_status_{conn}", color=RED)
-                    dpg.set_value(f"recording_pause_status_{conn}", "Not Recording")
-                    dpg.configure_item(f"recording_pause_status_{conn}", color=RED)
-
-                dpg.configure_item(f"fps_{conn}", color=WHITE)
-                dpg.configure_item(f"time_{conn}", color=WHITE)
-            except Exception as e:
-                dpg.set_value(f"time_{conn}", "Error!")
-                dpg.configure_item(f"time_{conn}", color=RED)
-                pass
-    
-    if not blackmagic_empty:
-        for conn in blackmagic_active_conns:
-            try:
-                recording = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/record").json().get('recording')
-                if recording:
-                    dpg.set_value(f"recording_status_{conn}", "Recording")
-                    dpg.configure_item(f"recording_status_{conn}", color=GREEN)
-                    timecode = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/timecode").json().get('display')
-                else:
-                    dpg.set_value(f"recording_status_{conn}", "Not Recording")
-                    dpg.configure_item(f"recording_status_{conn}", color=RED)
-                    timecode = requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/timecode").json().get('timeline')
-                dpg.set_value(f"time_{conn}", timecode)
-
-                dpg.configure_item(f"time_{conn}", color=WHITE)
-            except Exception as e:
-                dpg.set_value(f"time_{conn}", "Error!")
-                dpg.configure_item(f"time_{conn}", color=RED)
-                pass
+    profiler.phase("title")
+
+    while not config_changes.empty():
+        apply_config_changes(config_changes.get())
+    profiler.phase("config")
+
+    # Device widgets only need describing again once a status has changed, the grid also tracks which rows are on screen
+    store_version = manager.store.version
+    if device_grid is not None:
+        device_grid.update(store_version)
+        profiler.phase("grid")
+    elif store_version != rendered_store_version:
+        for device in profiler.devices(card_obs_devices):
+            describe_card(view, device, manager.store.get(device.key), COLORS)
+        profiler.phase("obs")
+
+        for device in profiler.devices(card_blackmagic_devices):
+            describe_card(view, device, manager.store.get(device.key), COLORS)
+        profiler.phase("blackmagic")
 
     # Update number of connections currently recording
-    try:
-        new_num_recording_conns = 0
-        for client in obs_active_clients:
-            if client.get_record_status().output_active:
-                new_num_recording_conns += 1
-        for conn in blackmagic_active_conns:
-            if requests.get(url=f"http://{conn['host']}/control/api/v1/transports/0/record").json().get('recording'):
-                new_num_recording_conns += 1
-        if new_num_recording_conns != num_recording_conns:
-            num_recording_conns = new_num_recording_conns
-            if num_active_conns == 1:
-                dpg.set_value("connection_status", f"{num_active_conns} connection, {num_recording_conns} recording")
-            else:
-                dpg.set_value("connection_status", f"{num_active_conns} connections, {num_recording_conns} recording")
-    except Exception as e:
-        print(f"Failed to update recording count: {e}")
-        pass
-
-    # Cap at target fps
+    if store_version != rendered_store_version:
+        rendered_store_version = store_version
+        view.set_value("connection_status", connection_status_text(manager.store.counts()))
+
+    if dpg.is_item_visible("diagnostics") and time.perf_counter() - diagnostics_updated >= 1:
+        diagnostics_updated = time.perf_counter()
+        view.set_value("diagnostics", format_report(METRICS.snapshot()))
+    profiler.phase("status")
+
+    # Preview frames go straight to their textures, comparing them would cost more than setting them
+    if previewer is not None:
+        frames = previewer.take_frames()
+        if frames:
+            with dpg.mutex():
+                for tag, preview in frames.items():
+                    dpg.set_value(tag, preview.data)
+    profiler.phase("previews")
+
+    view.flush()
+    profiler.phase("flush")
+
+    # Cap at target fps. Without recent input, also wait for a device status to change before drawing
+    # the next frame, redrawing at least at the idle framerate so live previews and hovers still update.
     frame_frequency = 1/dpg.get_value("target_framerate")
-    now = time.perf_counter()
-    elapsed_time = now - timing_counter
+    elapsed_time = time.perf_counter() - timing_counter
     if elapsed_time < frame_frequency:
-        target_time =  frame_frequency - elapsed_time
-        time.sleep(target_time)
-    timing_counter += frame_frequency
+        time.sleep(frame_frequency - elapsed_time)
+    if time.perf_counter() - last_input > INPUT_ACTIVE_SECONDS:
+        idle_remaining = 1/args.idle_framerate - (time.perf_counter() - timing_counter)
+        if idle_remaining > 0:
+            manager.store.wait_for_change(rendered_store_version, timeout=idle_remaining)
+    timing_counter = time.perf_counter()
+    profiler.phase("sleep")
 
     dpg.render_dearpygui_frame()
-
+    profiler.phase("render")
+    profiler.end_frame()
+
+    if startup_timer is not None:
+        startup_timer.mark("first frame")
+        startup_timer.print_report(manager.startup_results)
+        startup_timer = None
+        if args.exit_after_startup:
+            break
+
+if config_watcher is not None:
+    config_watcher.stop()
+if previewer is not None:
+    previewer.stop()
+if control_api is not None:
+    control_api.stop()
+if metrics_dumper is not None:
+    metrics_dumper.stop()
+if manager.journal is not None:
+    manager.journal.stop()
+manager.close()
 dpg.destroy_context()
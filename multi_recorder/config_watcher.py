@@ -0,0 +1,43 @@
+import os, threading
+
+# Watches a config file for changes by polling its modification time and size, which behaves the
+# same on every platform and with editors that save by replacing the file. on_change is called on
+# the watcher thread once the file has stayed the same for a whole interval, so a save that's still
+# being written isn't picked up halfway.
+class ConfigWatcher:
+    def __init__(self, path, on_change, interval=1):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="config_watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1)
+
+    def _stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _run(self):
+        applied = self._stamp()
+        previous = applied
+        while not self._stop_event.wait(self.interval):
+            stamp = self._stamp()
+            settled = stamp == previous
+            previous = stamp
+            if stamp is None or not settled or stamp == applied:
+                continue
+            applied = stamp
+            try:
+                self.on_change()
+            except Exception as e:
+                print(f"Failed to apply changes to {self.path}: {e}")
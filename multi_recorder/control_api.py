@@ -0,0 +1,144 @@
+import json, threading, time
+from instrumentation import METRICS
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+# Local HTTP control API for a DeviceManager, so scripts and other operators can share one
+# MultiRecorder process instead of each connecting to the devices themselves.
+#
+#   GET  /status                   counts and latest status of every device
+#   GET  /events                   Server-Sent Events stream, status changes are pushed as they happen
+#   GET  /metrics                  request latencies, errors and frame times as Prometheus text
+#   GET  /metrics.json             the same as JSON
+#   POST /record-all               start recording on every device
+#   POST /stop-all                 stop recording on every device
+#   POST /devices/<key>/toggle     toggle recording on one device
+#   POST /devices/<key>/pause      toggle pause on one OBS device
+#   POST /record-directory         get every device ready to record into {"path": ...}, with a result per device
+class ControlApiServer:
+    def __init__(self, manager, host="127.0.0.1", port=8765, min_push_interval=0.1):
+        self.manager = manager
+        self.min_push_interval = min_push_interval
+        self._stop_event = threading.Event()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="control_api", daemon=True)
+
+    @property
+    def address(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Headers and body are written separately, without this delayed ACKs add ~40 ms per response
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/status":
+                    self._send_json(200, api.manager.describe_all())
+                elif self.path == "/events":
+                    api._stream_events(self)
+                elif self.path == "/metrics":
+                    self._send_text(200, METRICS.to_prometheus(), "text/plain; version=0.0.4")
+                elif self.path == "/metrics.json":
+                    self._send_text(200, METRICS.to_json(), "application/json")
+                else:
+                    self._send_json(404, {'error': f"Unknown endpoint {self.path}"})
+
+            def do_POST(self):
+                parts = [unquote(part) for part in self.path.strip("/").split("/")]
+                try:
+                    if parts == ["record-all"]:
+                        self._send_json(200, {'results': [asdict(result) for result in api.manager.record_all()]})
+                    elif parts == ["stop-all"]:
+                        self._send_json(200, {'results': [asdict(result) for result in api.manager.stop_all()]})
+                    elif parts == ["record-directory"]:
+                        body = self._read_json()
+                        if not body.get('path'):
+                            return self._send_json(400, {'error': "path is required"})
+                        results = api.manager.prepare_recording(body['path'])
+                        self._send_json(200, {'results': [asdict(result) for result in results]})
+                    elif len(parts) == 3 and parts[0] == "devices" and parts[2] in ("toggle", "pause"):
+                        try:
+                            device = api.manager.device(parts[1])
+                        except KeyError:
+                            return self._send_json(404, {'error': f"Unknown device {parts[1]}"})
+                        if parts[2] == "toggle":
+                            device.toggle_recording()
+                        else:
+                            device.toggle_pause()
+                        self._send_json(200, {'ok': True})
+                    else:
+                        self._send_json(404, {'error': f"Unknown endpoint {self.path}"})
+                # Requests that can't work, e.g. pausing a BlackMagic device or a body that isn't JSON
+                except ValueError as e:
+                    self._send_json(400, {'error': str(e)})
+                except Exception as e:
+                    self._send_json(500, {'error': str(e)})
+
+            def _read_json(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _send_json(self, code, body):
+                self._send_text(code, json.dumps(body), "application/json")
+
+            def _send_text(self, code, text, content_type):
+                data = text.encode()
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    # Push the full status once, then only the devices that changed whenever the store changes.
+    # Changes are batched to at most one event per min_push_interval.
+    def _stream_events(self, handler):
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.end_headers()
+
+        store = self.manager.store
+        sent = {}
+        version = None
+        try:
+            while not self._stop_event.is_set():
+                new_version = store.wait_for_change(version, timeout=15)
+                if new_version == version:
+                    handler.wfile.write(b": keepalive\n\n")
+                    handler.wfile.flush()
+                    continue
+                version = new_version
+
+                snapshot = self.manager.describe_all()
+                changed = []
+                for device in snapshot['devices']:
+                    comparable = {k: v for k, v in device.items() if k != 'updated'}
+                    if sent.get(device['key']) != comparable:
+                        sent[device['key']] = comparable
+                        changed.append(device)
+                if changed:
+                    event = {'counts': snapshot['counts'], 'devices': changed}
+                    handler.wfile.write(f"event: status\ndata: {json.dumps(event)}\n\n".encode())
+                    handler.wfile.flush()
+                time.sleep(self.min_push_interval)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
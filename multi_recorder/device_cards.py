@@ -0,0 +1,62 @@
+# What the device cards and connection status in the GUI show for the latest device statuses. Widgets
+# are only described through a view model, so MultiRecorder and the load benchmark run the same code.
+# colors maps white, red, yellow and green to the GUI's colours.
+
+# Widgets a device card describes, as the prefixes of their tags
+CARD_TAGS = ("resolution", "fps", "recording_pause_status", "recording_status", "time", "input_source", "codec")
+
+# Format cached device info for display
+def resolution_text(metadata):
+    return metadata.resolution or "Error!"
+
+def fps_text(metadata):
+    return f"{metadata.fps} FPS" if metadata.fps is not None else "Error!"
+
+# Summary of how many connections are up and recording, derived from the device store counts
+def connection_status_text(counts):
+    text = f"{counts.active} connection, " if counts.active == 1 else f"{counts.active} connections, "
+    text += f"{counts.recording} recording"
+    if counts.paused:
+        text += f", {counts.paused} paused"
+    if counts.errored:
+        text += f", {counts.errored} not responding"
+    return text
+
+# Describe the card of one device from its status. An unreachable device keeps showing its last status
+# with the time marked as an error. OBS cards also show whether recording is paused, and their time
+# holds while paused, BlackMagic cards also show the deck's input and codec.
+def describe_card(view, device, status, colors):
+    key = device.key
+    if not status.reachable:
+        view.set_value(f"time_{key}", "Error!")
+        view.configure(f"time_{key}", color=colors['red'])
+        return
+
+    view.set_value(f"resolution_{key}", resolution_text(status.metadata))
+    view.set_value(f"fps_{key}", fps_text(status.metadata))
+    if device.kind == "blackmagic":
+        view.set_value(f"input_source_{key}", f"{status.metadata.input_source or 'Error!'}")
+        view.set_value(f"codec_{key}", f"{status.metadata.codec or 'Error!'}")
+
+    if status.recording:
+        view.set_value(f"recording_status_{key}", "Recording")
+        view.configure(f"recording_status_{key}", color=colors['green'])
+    else:
+        view.set_value(f"recording_status_{key}", "Not Recording")
+        view.configure(f"recording_status_{key}", color=colors['red'])
+
+    if device.kind == "obs":
+        if not status.recording:
+            view.set_value(f"recording_pause_status_{key}", "Not Recording")
+            view.configure(f"recording_pause_status_{key}", color=colors['red'])
+        elif status.paused:
+            view.set_value(f"recording_pause_status_{key}", "Paused")
+            view.configure(f"recording_pause_status_{key}", color=colors['yellow'])
+        else:
+            view.set_value(f"recording_pause_status_{key}", "Not Paused")
+            view.configure(f"recording_pause_status_{key}", color=colors['green'])
+            view.set_value(f"time_{key}", status.timecode)
+        view.configure(f"fps_{key}", color=colors['white'])
+    else:
+        view.set_value(f"time_{key}", status.timecode)
+    view.configure(f"time_{key}", color=colors['white'])
@@ -0,0 +1,171 @@
+import time
+import dearpygui.dearpygui as dpg
+from device_metadata import DeviceMetadata
+
+GROUP_BY = ("None", "Type", "Tag")
+UNTAGGED = "Untagged"
+KIND_LABELS = {'obs': "OBS", 'blackmagic': "BlackMagic"}
+
+# Compact grid with one row per device, for setups too large for a table per device. Rows can be
+# filtered and grouped by type or by the tags set in the config. The table only draws the rows on
+# screen, and only those rows are described through the view model and polled at the fast rate,
+# so frame time and network load stay flat as the fleet grows. colors maps white, red, yellow and
+# green to the GUI's colours.
+class DeviceGrid:
+    def __init__(self, manager, view, colors, record_callback, pause_callback, visibility_interval=0.1):
+        self.manager = manager
+        self.view = view
+        self.colors = colors
+        self.record_callback = record_callback
+        self.pause_callback = pause_callback
+        self.visibility_interval = visibility_interval
+        self.group_by = "Tag" if any(device.tags for device in manager.devices) else "Type"
+        self._filter = ""
+        self._dirty = True
+        self._groups = []
+        self._rows = []
+        self._visible = set()
+        self._visibility_checked = 0.0
+        self._rendered_version = None
+
+    # Add the filter, grouping and the table to the current container
+    def build(self, height=-1):
+        with dpg.group(horizontal=True):
+            dpg.add_input_text(hint="Filter by name, address, type or tag", width=280, callback=self._filter_changed)
+            dpg.add_combo(GROUP_BY, default_value=self.group_by, label="Group By", width=80, callback=self._group_by_changed)
+        with dpg.table(tag="device_grid", header_row=True, resizable=True, clipper=True, scrollY=True, freeze_rows=1, height=height,
+                       policy=dpg.mvTable_SizingStretchProp, row_background=True,
+                       borders_innerH=False, borders_outerH=True, borders_innerV=True, borders_outerV=True):
+            dpg.add_table_column(label="Name", init_width_or_weight=3)
+            dpg.add_table_column(label="Address", init_width_or_weight=3)
+            dpg.add_table_column(label="Format", init_width_or_weight=3)
+            dpg.add_table_column(label="Status", init_width_or_weight=2)
+            dpg.add_table_column(label="Length", init_width_or_weight=2)
+            dpg.add_table_column(label="", init_width_or_weight=2)
+
+    # Widget callbacks run off the render loop thread, so they only note what to rebuild
+    def _filter_changed(self, sender, app_data):
+        self._filter = app_data
+        self._dirty = True
+
+    def _group_by_changed(self, sender, app_data):
+        self.group_by = app_data
+        self._dirty = True
+
+    # Devices were added, removed or renamed, e.g. by a config reload
+    def devices_changed(self):
+        self._dirty = True
+
+    def _matches(self, device):
+        text = " ".join([device.name, device.address, KIND_LABELS[device.kind]] + device.tags).lower()
+        return all(word in text for word in self._filter.lower().split())
+
+    # List of (group name, devices), the name is None when not grouping
+    def _grouped(self, devices):
+        if self.group_by == "Type":
+            return [(label, [device for device in devices if device.kind == kind]) for kind, label in KIND_LABELS.items()
+                    if any(device.kind == kind for device in devices)]
+        if self.group_by == "Tag":
+            tags = list(dict.fromkeys(tag for device in devices for tag in device.tags))
+            groups = [(tag, [device for device in devices if tag in device.tags]) for tag in tags]
+            untagged = [device for device in devices if not device.tags]
+            return groups + [(UNTAGGED, untagged)] if untagged else groups
+        return [(None, devices)]
+
+    # Recreate the rows for the current filter and grouping. A device with several tags gets a row in each
+    # of their groups, so rows are identified by group and device.
+    def _rebuild(self):
+        for row, _ in self._rows:
+            for tag in (f"grid_format_{row}", f"grid_status_{row}", f"grid_time_{row}"):
+                self.view.invalidate(tag)
+        for index, _ in enumerate(self._groups):
+            self.view.invalidate(f"grid_group_{index}")
+        dpg.delete_item("device_grid", children_only=True, slot=1)
+
+        self._groups = self._grouped([device for device in self.manager.devices if self._matches(device)])
+        self._rows = []
+        for index, (name, devices) in enumerate(self._groups):
+            if name is not None:
+                with dpg.table_row(parent="device_grid"):
+                    dpg.add_text(name, tag=f"grid_group_{index}", color=self.colors['yellow'])
+            for device in devices:
+                row = f"{index}_{device.key}"
+                with dpg.table_row(parent="device_grid"):
+                    dpg.add_text(device.name)
+                    dpg.add_text(device.address)
+                    dpg.add_text("", tag=f"grid_format_{row}")
+                    dpg.add_text("", tag=f"grid_status_{row}")
+                    dpg.add_text("", tag=f"grid_time_{row}")
+                    with dpg.group(horizontal=True):
+                        dpg.add_button(label="Toggle", small=True, callback=self.record_callback, user_data=device)
+                        if device.kind == "obs":
+                            dpg.add_button(label="Pause/Resume", small=True, callback=self.pause_callback, user_data=device)
+                self._rows.append((row, device))
+        self._visible = set()
+        self._rendered_version = None
+
+    # Bring the grid up to date with the device store, call once per frame before the view is flushed
+    def update(self, store_version):
+        if self._dirty:
+            self._dirty = False
+            self._rebuild()
+
+        # Rows only report being visible once they've been drawn, so this lags a frame behind scrolling
+        now = time.perf_counter()
+        newly_visible = set()
+        if now - self._visibility_checked >= self.visibility_interval:
+            self._visibility_checked = now
+            visible = {row for row, _ in self._rows if dpg.is_item_visible(f"grid_time_{row}")}
+            if visible != self._visible:
+                newly_visible = visible - self._visible
+                self._visible = visible
+                self.manager.set_visible({device.key for row, device in self._rows if row in visible})
+
+        if store_version != self._rendered_version:
+            self._rendered_version = store_version
+            for index, (name, devices) in enumerate(self._groups):
+                if name is not None:
+                    self._describe_group(index, name, devices)
+            for row, device in self._rows:
+                if row in self._visible:
+                    self._describe_row(row, self.manager.store.get(device.key))
+        else:
+            for row, device in self._rows:
+                if row in newly_visible:
+                    self._describe_row(row, self.manager.store.get(device.key))
+
+    def _describe_group(self, index, name, devices):
+        statuses = [self.manager.store.get(device.key) for device in devices]
+        recording = sum(status.reachable and status.recording for status in statuses)
+        text = f"{name} - {recording}/{len(devices)} recording"
+        errored = sum(not status.reachable for status in statuses)
+        if errored:
+            text += f", {errored} not responding"
+        self.view.set_value(f"grid_group_{index}", text)
+
+    def _describe_row(self, row, status):
+        colors = self.colors
+        if not status.reachable:
+            self.view.set_value(f"grid_status_{row}", "Not Responding")
+            self.view.configure(f"grid_status_{row}", color=colors['red'])
+            self.view.set_value(f"grid_time_{row}", "Error!")
+            self.view.configure(f"grid_time_{row}", color=colors['red'])
+            return
+
+        metadata = status.metadata or DeviceMetadata()
+        video_format = f"{metadata.resolution or 'Error!'} @ {metadata.fps if metadata.fps is not None else 'Error!'}"
+        if metadata.codec:
+            video_format += f" {metadata.codec}"
+        self.view.set_value(f"grid_format_{row}", video_format)
+
+        if status.recording and status.paused:
+            self.view.set_value(f"grid_status_{row}", "Paused")
+            self.view.configure(f"grid_status_{row}", color=colors['yellow'])
+        elif status.recording:
+            self.view.set_value(f"grid_status_{row}", "Recording")
+            self.view.configure(f"grid_status_{row}", color=colors['green'])
+        else:
+            self.view.set_value(f"grid_status_{row}", "Not Recording")
+            self.view.configure(f"grid_status_{row}", color=colors['red'])
+        self.view.set_value(f"grid_time_{row}", status.timecode)
+        self.view.configure(f"grid_time_{row}", color=colors['white'])
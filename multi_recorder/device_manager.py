@@ -0,0 +1,513 @@
+import os, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+import record_dispatcher
+from device_metadata import DeviceMetadata, MetadataCache, fetch_hyperdeck_metadata
+from device_poller import DevicePoller, DeviceStatus, PollSchedule
+from device_store import DeviceStateStore
+from startup import run_concurrently
+
+# Settings for connecting to and polling devices, normally filled in from the command line args
+@dataclass(frozen=True)
+class DeviceSettings:
+    startup_timeout: float = 5
+    obs_resync_interval: float = 5
+    metadata_ttl: float = 60
+    poll_interval: float = 0.1
+    idle_poll_interval: float = 1
+    max_backoff: float = 30
+    capture_previews: bool = False
+    preview_width: int = 400
+
+def obs_key(conn):
+    return f"obs:{conn['host']}:{conn['port']}"
+
+def blackmagic_key(conn):
+    return f"blackmagic:{conn['host']}"
+
+# Tags a connection is grouped by in the GUI, from tags in the config as a list or a single string
+def conn_tags(conn):
+    tags = conn.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tags]
+    return [str(tag) for tag in tags]
+
+# Make text safe to use as a file or clip name on any platform
+def safe_filename(text):
+    return re.sub(r'[<>:"/\\|?*\x00-\x1f]', "_", text).strip(" .") or "_"
+
+# Seconds as 1h02m or 12m
+def format_record_time(seconds):
+    hours, minutes = divmod(int(seconds) // 60, 60)
+    return f"{hours}h{minutes:02}m" if hours else f"{minutes}m"
+
+# How the connections in a config differ from the ones already active
+@dataclass
+class ConnectionDiff:
+    obs_added: list
+    blackmagic_added: list
+    removed: list # Keys of active connections no longer in the config
+    updated: list # (key, connection) for connections with a different name, tags or polling, their device is kept
+
+    @property
+    def empty(self):
+        return not (self.obs_added or self.blackmagic_added or self.removed or self.updated)
+
+# Compare the connections in cfg against active, the active connections by key. A connection sharing a
+# host (and port for OBS) with an earlier one in the config is dropped here, so only one connection is
+# ever made to a device.
+def diff_connections(active, cfg):
+    wanted = {}
+    obs_conns = []
+    for conn in cfg.get('obs_connections') or []:
+        if obs_key(conn) in wanted:
+            print(f"Duplicate OBS connections in config @ {conn['host']}:{conn['port']}, only one connection will be established.")
+            continue
+        wanted[obs_key(conn)] = conn
+        obs_conns.append(conn)
+    blackmagic_conns = []
+    for conn in cfg.get('blackmagic_connections') or []:
+        if blackmagic_key(conn) in wanted:
+            print(f"Duplicate BlackMagic connections in config @ {conn['host']}, only one connection will be established.")
+            continue
+        wanted[blackmagic_key(conn)] = conn
+        blackmagic_conns.append(conn)
+    return ConnectionDiff(
+        obs_added=[conn for conn in obs_conns if obs_key(conn) not in active],
+        blackmagic_added=[conn for conn in blackmagic_conns if blackmagic_key(conn) not in active],
+        removed=[key for key in active if key not in wanted],
+        updated=[(key, conn) for key, conn in wanted.items() if key in active and active[key] != conn])
+
+# Devices changed by DeviceManager.apply_config, or a failed connection connecting later, so a GUI
+# only has to rebuild those
+@dataclass
+class ConfigChanges:
+    added: list
+    removed: list
+    updated: list
+    failed: list # Connections that were added to the config but couldn't connect
+
+# A connected OBS instance
+class ObsDevice:
+    kind = "obs"
+
+    def __init__(self, conn, state):
+        self.conn = conn
+        self.name = conn['name']
+        self.key = obs_key(conn)
+        self.address = f"{conn['host']}:{conn['port']}"
+        self.tags = conn_tags(conn)
+        self.state = state
+        self.metadata = state.metadata
+        self.preview = None
+
+    def status(self):
+        return self.state.status()
+
+    def toggle_recording(self):
+        self.state.client.toggle_record()
+
+    def toggle_pause(self):
+        self.state.client.toggle_record_pause()
+
+    def set_record_directory(self, directory_path):
+        self.state.client.set_record_directory(directory_path)
+
+    # Record into record_dir/video/<name>. OBS may be on another machine where the directory can't be
+    # created from here, so it's still set if creating it fails. Returns what was done.
+    def prepare_recording(self, record_dir, clip_name):
+        directory_path = os.path.join(record_dir, "video", safe_filename(self.name))
+        try:
+            os.makedirs(directory_path, exist_ok=True)
+            created = ""
+        except OSError as e:
+            created = f", couldn't create it here: {e}"
+        self.set_record_directory(directory_path)
+        return f"recording to {directory_path}{created}"
+
+    def dispatch_target(self, recording):
+        client = lambda: self.state.client
+        return record_dispatcher.DispatchTarget(
+            name=self.name,
+            needs_command=lambda: client().get_record_status().output_active != recording,
+            command=lambda: client().start_record() if recording else client().stop_record(),
+            key=self.key)
+
+    def close(self):
+        self.state.close()
+
+# A connected BlackMagic HyperDeck
+class BlackmagicDevice:
+    kind = "blackmagic"
+
+    def __init__(self, conn, client, metadata):
+        self.conn = conn
+        self.name = conn['name']
+        self.key = blackmagic_key(conn)
+        self.address = conn['host']
+        self.tags = conn_tags(conn)
+        self.client = client
+        self.metadata = metadata
+        self.clip_name = None
+
+    # Read the current status of the deck, runs on a poller thread
+    def status(self):
+        recording = self.client.get_recording()
+        timecode = self.client.get_timecode()
+        # The deck can be reachable without reporting its video format, that shouldn't fail the poll
+        try:
+            metadata = self.metadata.get()
+        except Exception:
+            metadata = self.metadata.peek() or DeviceMetadata()
+        return DeviceStatus(
+            reachable=True,
+            recording=recording,
+            timecode=timecode.display if recording else timecode.timeline,
+            metadata=metadata,
+            updated=time.monotonic())
+
+    def toggle_recording(self):
+        self.client.toggle_recording(self.clip_name)
+
+    # HyperDecks record to their own media, so only the clip name comes from record_dir. The slot with the
+    # most record time left is made active, unless the deck is recording and can't switch. Returns what was done.
+    def prepare_recording(self, record_dir, clip_name):
+        slots = [slot for slot in self.client.get_media_slots() if slot.remaining_record_time > 0]
+        if not slots:
+            raise RuntimeError("no media with space left")
+        slot = max(slots, key=lambda slot: slot.remaining_record_time)
+        active = next((current for current in slots if current.active), None)
+        if not slot.active and not self.client.get_recording():
+            self.client.set_active_slot(slot.index)
+            active = slot
+        self.clip_name = clip_name
+        if active is None:
+            return f"clip name {clip_name}, no active slot"
+        return f"clip name {clip_name}, recording to {active.device_name or f'slot {active.index}'} with {format_record_time(active.remaining_record_time)} left"
+
+    def toggle_pause(self):
+        raise ValueError(f"{self.name} is a BlackMagic device, which can't pause recording")
+
+    def dispatch_target(self, recording):
+        return record_dispatcher.DispatchTarget(
+            name=self.name,
+            needs_command=lambda: self.client.get_recording() != recording,
+            command=lambda: self.client.set_recording(recording, self.clip_name),
+            key=self.key)
+
+    def close(self):
+        self.client.close()
+
+# Clips are named after the record directory and the device, so they can be told apart once copied off the decks
+def clip_name(record_dir, device):
+    directory_name = Path(record_dir).name
+    return safe_filename(f"{directory_name} {device.name}" if directory_name else device.name)
+
+def print_prepare_report(record_dir, results):
+    failed = [result for result in results if not result.ok]
+    print(f"Record Directory {record_dir}: {len(results) - len(failed)} ready, {len(failed)} failed")
+    for result in results:
+        print(f" - {result.name}: {result.value}" if result.ok else f" - {result.name}: failed: {result.error}")
+
+# Size to capture an OBS preview at, scaled down to preview_width unless it is 0 for full resolution
+def preview_size(metadata, preview_width):
+    if preview_width <= 0 or metadata.width <= preview_width:
+        return metadata.width, metadata.height
+    return preview_width, max(1, round(metadata.height * preview_width / metadata.width))
+
+# Owns every device connection and keeps their status current in a DeviceStateStore, independent
+# of any GUI. The GUI, the headless control API or anything else reads status from the store and
+# controls devices through the manager.
+class DeviceManager:
+    def __init__(self, settings):
+        self.settings = settings
+        self.store = DeviceStateStore()
+        self.obs_connections = []
+        self.blackmagic_connections = []
+        self.obs_devices = []
+        self.blackmagic_devices = []
+        self.failed_conns = []
+        self.startup_results = []
+        self.poller = None
+        self.journal = None
+        self.on_change = None # Called with ConfigChanges when a failed connection connects in the background
+        self._pending = {} # Keys of failed connections being retried, to (connection, connect function)
+        self._reconnecting = set()
+        # Connection attempts can take seconds, they get their own few threads so they never hold up polls of live devices
+        self._reconnect_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="reconnect")
+        self._config_lock = threading.Lock()
+
+    @property
+    def devices(self):
+        return self.obs_devices + self.blackmagic_devices
+
+    def device(self, key):
+        for device in self.devices:
+            if device.key == key:
+                return device
+        raise KeyError(key)
+
+    # Connect to every connection in the config at once, so offline devices only cost the startup timeout once rather than each
+    def connect(self, cfg, report_empty=True):
+        self.obs_connections = cfg.get('obs_connections') or []
+        if len(self.obs_connections) == 0 and report_empty:
+            print("No OBS connections found in config.")
+        self.blackmagic_connections = cfg.get('blackmagic_connections') or []
+        if len(self.blackmagic_connections) == 0 and report_empty:
+            print("No BlackMagic connections found in config.")
+
+        diff = diff_connections({}, cfg)
+        obs_devices, blackmagic_devices, self.failed_conns, self.startup_results = self._connect_all(diff.obs_added, diff.blackmagic_added)
+        self.obs_devices = self.obs_devices + obs_devices
+        self.blackmagic_devices = self.blackmagic_devices + blackmagic_devices
+
+        if len(self.obs_devices) == 0 and len(self.obs_connections) > 0 and report_empty:
+            print("All OBS connections failed.")
+        if len(self.blackmagic_devices) == 0 and len(self.blackmagic_connections) > 0 and report_empty:
+            print("All BlackMagic connections failed.")
+
+    # Connect to the given connections at once and add their devices to the store, returns
+    # (obs devices, blackmagic devices, failed connections, startup results). Failed connections
+    # keep being retried in the background.
+    def _connect_all(self, obs_conns, blackmagic_conns):
+        startup_results = run_concurrently(
+            [(conn['name'], lambda conn=conn: self._connect_obs(conn)) for conn in obs_conns] +
+            [(conn['name'], lambda conn=conn: self._connect_blackmagic(conn)) for conn in blackmagic_conns],
+            deadline=self.settings.startup_timeout, discard_fn=lambda connection: connection[0].close())
+
+        obs_devices, blackmagic_devices, failed_conns = [], [], []
+        for conn, result in zip(obs_conns + blackmagic_conns, startup_results):
+            if result.ok:
+                device, status = result.value
+                if device.kind == "obs":
+                    obs_devices.append(device)
+                else:
+                    blackmagic_devices.append(device)
+                self.store.add(device.key, status)
+                print(f"Successfully connected to {conn['name']} at {device.address}")
+            else:
+                failed_conns.append(conn)
+                if conn in obs_conns:
+                    print(f"Failed to connect to {conn['name']} at {conn['host']}:{conn['port']}: {result.error}")
+                    self._add_pending(obs_key(conn), conn, self._connect_obs, result.error)
+                else:
+                    print(f"Failed to connect to {conn['name']} at {conn['host']}: {result.error}")
+                    self._add_pending(blackmagic_key(conn), conn, self._connect_blackmagic, result.error)
+        return obs_devices, blackmagic_devices, failed_conns, startup_results
+
+    # A connection that failed stays in the store as unreachable, and once polling has started every poll
+    # of it is another attempt to connect, backing off like any unreachable device
+    def _add_pending(self, key, conn, connect_fn, error):
+        self._pending[key] = (conn, connect_fn)
+        self.store.add(key, DeviceStatus(reachable=False, error=error, updated=time.monotonic()))
+        if self.poller is not None:
+            self.poller.add_device(key, lambda: self._reconnect(key, conn, connect_fn), self.poll_schedule(conn))
+
+    # Poll of a pending connection, runs on a poller thread. Starts an attempt to connect on the reconnect
+    # threads unless one is already running, and reports the connection as unreachable until one succeeds.
+    def _reconnect(self, key, conn, connect_fn):
+        with self._config_lock:
+            if key not in self._reconnecting:
+                self._reconnecting.add(key)
+                self._reconnect_executor.submit(self._try_connect, key, conn, connect_fn)
+        raise ConnectionError(self.store.get(key).error or "connecting")
+
+    # Once connected the device takes over its placeholder in the poller and is announced through on_change
+    def _try_connect(self, key, conn, connect_fn):
+        try:
+            device, status = connect_fn(conn)
+        except Exception as e:
+            with self._config_lock:
+                self._reconnecting.discard(key)
+                if self._pending.get(key, (None,))[0] is conn:
+                    self.store.update(key, DeviceStatus(reachable=False, error=str(e) or type(e).__name__, updated=time.monotonic()))
+            return
+        with self._config_lock:
+            self._reconnecting.discard(key)
+            # A config reload may have removed the connection or connected it itself in the meantime
+            if self._pending.get(key, (None,))[0] is not conn:
+                device.close()
+                return
+            del self._pending[key]
+            self.failed_conns = [failed for failed in self.failed_conns if failed is not conn]
+            if device.kind == "obs":
+                self.obs_devices = self.obs_devices + [device]
+            else:
+                self.blackmagic_devices = self.blackmagic_devices + [device]
+            self.store.update(key, status)
+            self.poller.add_device(key, device.status, self.poll_schedule(conn))
+        print(f"Connected to {conn['name']} at {device.address} after it failed to connect")
+        if self.on_change is not None:
+            self.on_change(ConfigChanges(added=[device], removed=[], updated=[], failed=[]))
+
+    # Bring the connections in line with a changed config without touching the devices that didn't
+    # change, so their recordings and polling carry on. Connections that failed before are retried.
+    # Device lists are replaced rather than changed in place, so readers iterating them are unaffected.
+    def apply_config(self, cfg):
+        with self._config_lock:
+            active = {device.key: device.conn for device in self.devices}
+            diff = diff_connections(active, cfg)
+            self.obs_connections = cfg.get('obs_connections') or []
+            self.blackmagic_connections = cfg.get('blackmagic_connections') or []
+
+            # Pending connections still in the config are connected again below, like any other added connection
+            added_keys = {obs_key(conn) for conn in diff.obs_added} | {blackmagic_key(conn) for conn in diff.blackmagic_added}
+            for key in self._pending:
+                if key not in added_keys:
+                    if self.poller is not None:
+                        self.poller.remove_device(key)
+                    else:
+                        self.store.remove(key)
+            self._pending = {}
+
+            if diff.empty:
+                self.failed_conns = []
+                return ConfigChanges(added=[], removed=[], updated=[], failed=[])
+
+            removed = [device for device in self.devices if device.key in diff.removed]
+            self.obs_devices = [device for device in self.obs_devices if device.key not in diff.removed]
+            self.blackmagic_devices = [device for device in self.blackmagic_devices if device.key not in diff.removed]
+            for device in removed:
+                if self.poller is not None:
+                    self.poller.remove_device(device.key)
+                else:
+                    self.store.remove(device.key)
+                device.close()
+                print(f"Disconnected from {device.name} at {device.address}")
+
+            updated = []
+            for key, conn in diff.updated:
+                device = self.device(key)
+                device.conn = conn
+                device.name = conn['name']
+                device.tags = conn_tags(conn)
+                if self.poller is not None:
+                    self.poller.add_device(device.key, device.status, self.poll_schedule(conn))
+                updated.append(device)
+
+            obs_devices, blackmagic_devices, failed_conns, _ = self._connect_all(diff.obs_added, diff.blackmagic_added)
+            if self.poller is not None:
+                for device in obs_devices + blackmagic_devices:
+                    self.poller.add_device(device.key, device.status, self.poll_schedule(device.conn))
+            self.obs_devices = self.obs_devices + obs_devices
+            self.blackmagic_devices = self.blackmagic_devices + blackmagic_devices
+            self.failed_conns = failed_conns
+
+            print(f"Config applied: {len(obs_devices) + len(blackmagic_devices)} connected, {len(removed)} disconnected, "
+                  f"{len(updated)} updated, {len(failed_conns)} failed")
+            return ConfigChanges(added=obs_devices + blackmagic_devices, removed=removed, updated=updated, failed=failed_conns)
+
+    # Connect to an OBS instance and read its initial state and preview, runs on a startup thread.
+    # obsws_python is slow to import, so it's only imported once there's an OBS connection.
+    def _connect_obs(self, conn):
+        from obs_state import ObsState
+        state = ObsState(host=conn['host'], port=conn['port'], resync_interval=self.settings.obs_resync_interval, metadata_ttl=self.settings.metadata_ttl, key=obs_key(conn))
+        device = ObsDevice(conn, state)
+        # OBS events only change the cache, poll it straight away so the store sees the change
+        state.on_change = lambda: self._poll_now(device.key)
+
+        # Get an initial screenshot, useful for confirming it's recording the correct thing
+        if self.settings.capture_previews:
+            from previews import blank_preview, capture_preview
+            size = preview_size(state.metadata.get(), self.settings.preview_width)
+            try:
+                device.preview = capture_preview(state.client, *size)
+            except Exception as e:
+                print(f"Failed to get {conn['name']} preview: {e}")
+                device.preview = blank_preview(*size)
+        return device, device.status()
+
+    # Connect to a BlackMagic device and read its initial state and video format, runs on a startup thread.
+    # Likewise requests is only imported once there's a BlackMagic connection.
+    def _connect_blackmagic(self, conn):
+        from hyperdeck import HyperDeckClient
+        client = HyperDeckClient(host=conn['host'], key=blackmagic_key(conn))
+        metadata = MetadataCache(lambda: fetch_hyperdeck_metadata(client), ttl=self.settings.metadata_ttl)
+        try:
+            client.get_recording()
+        except Exception:
+            client.close()
+            raise
+        try:
+            metadata.refresh()
+        except Exception as e:
+            print(f"Failed to get {conn['name']} video format: {e}")
+        device = BlackmagicDevice(conn, client, metadata)
+        return device, device.status()
+
+    # Polling rates for a connection, from the config if set there and the settings otherwise
+    def poll_schedule(self, conn):
+        return PollSchedule(
+            interval=conn.get('poll_interval', self.settings.poll_interval),
+            idle_interval=conn.get('idle_poll_interval', self.settings.idle_poll_interval),
+            max_backoff=self.settings.max_backoff)
+
+    # Poll every device in the background so readers never wait on the network
+    def start(self):
+        # Pool threads are only created as they're needed, so devices added by a config reload can share them
+        self.poller = DevicePoller(self.store, max_workers=32)
+        for device in self.devices:
+            self.poller.add_device(device.key, device.status, self.poll_schedule(device.conn))
+        for key, (conn, connect_fn) in self._pending.items():
+            self.poller.add_device(key, lambda key=key, conn=conn, connect_fn=connect_fn: self._reconnect(key, conn, connect_fn), self.poll_schedule(conn))
+        self.poller.start()
+
+    def _poll_now(self, key):
+        if self.poller is not None:
+            self.poller.poll_now(key)
+
+    # Only poll the devices in keys at the fast rate, None for every device
+    def set_visible(self, keys):
+        if self.poller is not None:
+            self.poller.set_visible(keys)
+
+    def close(self):
+        if self.poller is not None:
+            self.poller.stop()
+        self._reconnect_executor.shutdown(wait=False, cancel_futures=True)
+        for device in self.devices:
+            device.close()
+
+    def record_all(self):
+        results = record_dispatcher.dispatch([device.dispatch_target(recording=True) for device in self.devices])
+        record_dispatcher.print_report("Record All", results)
+        if self.journal is not None:
+            self.journal.log_dispatch("record", results)
+        return results
+
+    def stop_all(self):
+        results = record_dispatcher.dispatch([device.dispatch_target(recording=False) for device in self.devices])
+        record_dispatcher.print_report("Stop All", results)
+        if self.journal is not None:
+            self.journal.log_dispatch("stop", results)
+        return results
+
+    # Get every device ready to record into record_dir at once, see prepare_recording on each device.
+    # Returns a StartupResult per device, value is what was done.
+    def prepare_recording(self, record_dir, report=True):
+        results = run_concurrently(
+            [(device.name, lambda device=device: device.prepare_recording(record_dir, clip_name(record_dir, device))) for device in self.devices],
+            deadline=self.settings.startup_timeout)
+        if report:
+            print_prepare_report(record_dir, results)
+        return results
+
+    # Refetch cached device info for all devices on their next poll
+    def refresh_metadata(self):
+        for device in self.devices:
+            device.metadata.invalidate()
+
+    # JSON-friendly view of a device and its latest status
+    def describe(self, device, status=None):
+        status = status or self.store.get(device.key)
+        description = {'key': device.key, 'kind': device.kind, 'name': device.name, 'address': device.address, 'tags': device.tags}
+        description.update(asdict(status))
+        return description
+
+    def describe_all(self):
+        snapshots = self.store.snapshots()
+        return {
+            'counts': asdict(self.store.counts()),
+            'devices': [self.describe(device, snapshots.get(device.key)) for device in self.devices],
+        }
@@ -0,0 +1,72 @@
+import threading, time
+from dataclasses import dataclass
+
+# Static details of a device's video output, fields are None when the device doesn't report them
+@dataclass(frozen=True)
+class DeviceMetadata:
+    width: int = None
+    height: int = None
+    fps: float = None
+    codec: str = None
+    input_source: str = None
+    fetched: float = 0.0
+
+    @property
+    def resolution(self):
+        if self.width is None or self.height is None:
+            return None
+        return f"{self.width}x{self.height}"
+
+    @property
+    def aspect_ratio(self):
+        if not self.width or not self.height:
+            return None
+        return self.height / self.width
+
+# Caches a device's metadata so it is fetched once at connect time rather than every time it
+# is displayed. The cache is refetched after invalidate() or once ttl seconds have passed.
+class MetadataCache:
+    def __init__(self, fetch_fn, ttl=60):
+        self._fetch_fn = fetch_fn
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._metadata = None
+
+    # Cached metadata, fetching it first if missing or expired
+    def get(self):
+        metadata = self._metadata
+        if metadata is None or time.monotonic() - metadata.fetched >= self.ttl:
+            return self.refresh()
+        return metadata
+
+    # Cached metadata without ever fetching, None if nothing has been fetched yet
+    def peek(self):
+        return self._metadata
+
+    def refresh(self):
+        with self._lock:
+            self._metadata = self._fetch_fn()
+            return self._metadata
+
+    def invalidate(self):
+        self._metadata = None
+
+# Fetch metadata from an OBS ReqClient
+def fetch_obs_metadata(client):
+    video_settings = client.get_video_settings()
+    return DeviceMetadata(
+        width=video_settings.base_width,
+        height=video_settings.base_height,
+        fps=video_settings.fps_numerator / video_settings.fps_denominator,
+        fetched=time.monotonic())
+
+# Fetch metadata from a HyperDeckClient, the clip has no video format when the deck has no input
+def fetch_hyperdeck_metadata(client):
+    clip = client.get_clip()
+    return DeviceMetadata(
+        width=clip.width,
+        height=clip.height,
+        fps=float(clip.frame_rate) if clip.frame_rate is not None else None,
+        codec=clip.codec,
+        input_source=client.get_input_video_source(),
+        fetched=time.monotonic())
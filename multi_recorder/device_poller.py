@@ -0,0 +1,127 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from device_metadata import DeviceMetadata
+
+# Immutable snapshot of the most recent status read from a device
+@dataclass(frozen=True)
+class DeviceStatus:
+    reachable: bool = False
+    recording: bool = False
+    paused: bool = False
+    timecode: str = ""
+    metadata: DeviceMetadata = None
+    error: str = ""
+    updated: float = 0.0
+
+# How often a device is polled. Devices are polled every interval seconds while recording and
+# every idle_interval seconds otherwise, or when nothing is showing them. Unreachable devices back
+# off exponentially from interval up to max_backoff seconds, each of those polls doubles as a
+# reconnect attempt.
+@dataclass(frozen=True)
+class PollSchedule:
+    interval: float = 0.1
+    idle_interval: float = 1.0
+    max_backoff: float = 30.0
+
+    def next_interval(self, status, failures, visible=True):
+        if failures:
+            # Stop doubling well before the float overflows, long after reaching max_backoff anyway
+            return min(self.max_backoff, self.interval * 2 ** min(failures, 30))
+        if status.recording and visible:
+            return self.interval
+        return self.idle_interval
+
+# Polls every registered device on its own schedule using a thread pool, and publishes
+# the latest DeviceStatus for each one into a DeviceStateStore. Readers never touch the
+# network, they only read whatever status was published last.
+class DevicePoller:
+    def __init__(self, store, max_workers=8, tick=0.005):
+        self.store = store
+        self._tick = tick
+        self._devices = {}
+        self._next_poll = {}
+        self._failures = {}
+        self._in_flight = set()
+        self._visible = None
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="device_poll")
+        self._thread = threading.Thread(target=self._run, name="device_poller", daemon=True)
+
+    # Register a device; poll_fn is called from a worker thread and must return a DeviceStatus
+    def add_device(self, key, poll_fn, schedule):
+        with self._lock:
+            self._devices[key] = (poll_fn, schedule)
+            self._next_poll[key] = 0.0
+            self._failures[key] = 0
+        self.store.add(key)
+
+    def remove_device(self, key):
+        with self._lock:
+            self._devices.pop(key, None)
+            self._next_poll.pop(key, None)
+            self._failures.pop(key, None)
+        self.store.remove(key)
+
+    # Limit fast polling to the devices in keys, e.g. the ones on screen. None makes every device
+    # visible again. Devices that just became visible are polled straight away.
+    def set_visible(self, keys):
+        with self._lock:
+            previous = self._visible
+            self._visible = set(keys) if keys is not None else None
+            if previous is not None:
+                for key in (self._next_poll.keys() if keys is None else self._visible - previous):
+                    if key in self._next_poll:
+                        self._next_poll[key] = 0.0
+
+    # Poll a device as soon as possible, e.g. when it reported a change itself
+    def poll_now(self, key):
+        with self._lock:
+            if key in self._next_poll:
+                self._next_poll[key] = 0.0
+
+    # Latest published status for a device, never blocks on I/O
+    def get(self, key):
+        return self.store.get(key)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            with self._lock:
+                due = [(key, *self._devices[key]) for key, next_poll in self._next_poll.items()
+                       if next_poll <= now and key not in self._in_flight]
+                for key, _, _ in due:
+                    self._in_flight.add(key)
+            for key, poll_fn, schedule in due:
+                self._executor.submit(self._poll, key, poll_fn, schedule)
+            self._stop_event.wait(self._tick)
+
+    def _poll(self, key, poll_fn, schedule):
+        try:
+            status = poll_fn()
+        except Exception as e:
+            status = DeviceStatus(reachable=False, error=str(e), updated=time.monotonic())
+        with self._lock:
+            self._in_flight.discard(key)
+            # Device may have been removed while its poll was running
+            if key in self._devices:
+                failures = 0 if status.reachable else self._failures[key] + 1
+                self._failures[key] = failures
+                # Always schedule the next poll, otherwise a device whose update fails is polled every tick
+                interval = schedule.max_backoff
+                try:
+                    self.store.update(key, status)
+                    visible = self._visible is None or key in self._visible
+                    interval = schedule.next_interval(status, failures, visible)
+                finally:
+                    self._next_poll[key] = time.monotonic() + interval
@@ -0,0 +1,96 @@
+import threading
+from dataclasses import dataclass, replace
+from device_poller import DeviceStatus
+
+# Aggregate counts across every device in a DeviceStateStore
+@dataclass(frozen=True)
+class DeviceCounts:
+    total: int = 0
+    active: int = 0
+    recording: int = 0
+    paused: int = 0
+    errored: int = 0
+
+# Holds the latest DeviceStatus for every device. Status updates are written here once, and the
+# aggregate counts are adjusted incrementally from the old and new status of the device that
+# changed, so reading them never needs another pass over the devices. version is bumped on
+# every change so readers can tell when there's something new, or wait for it. A status that only
+# differs from the last one by when it was read isn't a change, so idle devices don't bump it.
+# Listeners are called with (key, status) for every change as it is made, status is None once a
+# device is removed. They're called with the store locked, so they must be quick and not block.
+class DeviceStateStore:
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._statuses = {}
+        self._listeners = []
+        self._counts = {"active": 0, "recording": 0, "paused": 0, "errored": 0}
+        self.version = 0
+
+    # The listener is called with every current status first, so it misses nothing in between
+    def add_listener(self, listener):
+        with self._lock:
+            for key, status in self._statuses.items():
+                listener(key, status)
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def add(self, key, status=None):
+        with self._lock:
+            if key not in self._statuses:
+                self._statuses[key] = DeviceStatus()
+                self._count(self._statuses[key], 1)
+                self._changed(key, self._statuses[key])
+        if status is not None:
+            self.update(key, status)
+
+    def remove(self, key):
+        with self._lock:
+            status = self._statuses.pop(key, None)
+            if status is not None:
+                self._count(status, -1)
+                self._changed(key, None)
+
+    def update(self, key, status):
+        with self._lock:
+            previous = self._statuses.get(key)
+            if previous is None or replace(previous, updated=status.updated) == status:
+                return
+            self._statuses[key] = status
+            self._count(previous, -1)
+            self._count(status, 1)
+            self._changed(key, status)
+
+    # Block until the version moves past version or timeout seconds pass, returns the current version
+    def wait_for_change(self, version, timeout=None):
+        with self._lock:
+            self._lock.wait_for(lambda: self.version != version, timeout=timeout)
+            return self.version
+
+    def get(self, key):
+        return self._statuses.get(key, DeviceStatus())
+
+    def snapshots(self):
+        with self._lock:
+            return dict(self._statuses)
+
+    def counts(self):
+        with self._lock:
+            return DeviceCounts(total=len(self._statuses), **self._counts)
+
+    def _changed(self, key, status):
+        self.version += 1
+        self._lock.notify_all()
+        for listener in self._listeners:
+            listener(key, status)
+
+    def _count(self, status, delta):
+        if status.reachable:
+            self._counts["active"] += delta
+            self._counts["recording"] += delta * status.recording
+            self._counts["paused"] += delta * (status.recording and status.paused)
+        else:
+            self._counts["errored"] += delta
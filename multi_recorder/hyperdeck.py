@@ -0,0 +1,100 @@
+import requests
+from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from instrumentation import METRICS
+
+# Video details of the current clip, fields are None when the deck isn't receiving input
+@dataclass(frozen=True)
+class ClipInfo:
+    width: int = None
+    height: int = None
+    frame_rate: str = None
+    codec: str = None
+
+@dataclass(frozen=True)
+class Timecode:
+    display: str = None
+    timeline: str = None
+
+# A slot in the deck's working set, e.g. an SD card or SSD. remaining_record_time is in seconds
+@dataclass(frozen=True)
+class MediaSlot:
+    index: int
+    device_name: str = None
+    volume: str = None
+    remaining_record_time: int = 0
+    active: bool = False
+
+# Client for the HyperDeck REST API. Requests share a keep-alive connection pool instead
+# of opening a new TCP connection per call, and transient failures are retried with backoff.
+# Calls are timed into METRICS under key, including any retries.
+class HyperDeckClient:
+    def __init__(self, host, timeout=1, retries=2, backoff_factor=0.1, pool_size=4, key=None):
+        self.host = host
+        self.key = key or f"blackmagic:{host}"
+        self.timeout = timeout
+        self._api_url = f"http://{host}/control/api/v1"
+        self._base_url = f"{self._api_url}/transports/0"
+        self._session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(502, 503, 504), allowed_methods=None)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self._session.mount("http://", adapter)
+
+    # Endpoints are relative to the first transport unless base_url says otherwise
+    def _get(self, endpoint, base_url=None):
+        with METRICS.time_request(self.key, f"GET {endpoint}"):
+            response = self._session.get(f"{base_url or self._base_url}/{endpoint}", timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+
+    def _put(self, endpoint, data, base_url=None):
+        with METRICS.time_request(self.key, f"PUT {endpoint}"):
+            response = self._session.put(f"{base_url or self._base_url}/{endpoint}", json=data, timeout=self.timeout)
+            response.raise_for_status()
+
+    def get_recording(self):
+        return bool(self._get("record").get('recording'))
+
+    # clip_name names the clip a recording starts, the deck numbers clips that share a name
+    def set_recording(self, recording, clip_name=None):
+        data = {'recording': bool(recording)}
+        if recording and clip_name:
+            data['clipName'] = clip_name
+        self._put("record", data)
+
+    def toggle_recording(self, clip_name=None):
+        self.set_recording(not self.get_recording(), clip_name)
+
+    def get_timecode(self):
+        timecode = self._get("timecode")
+        return Timecode(display=timecode.get('display'), timeline=timecode.get('timeline'))
+
+    def get_clip(self):
+        clip = self._get("clip").get('clip') or {}
+        video_format = clip.get('videoFormat') or {}
+        codec_format = clip.get('codecFormat') or {}
+        return ClipInfo(
+            width=video_format.get('width'),
+            height=video_format.get('height'),
+            frame_rate=video_format.get('frameRate'),
+            codec=codec_format.get('codec'))
+
+    def get_input_video_source(self):
+        return self._get("inputVideoSource").get('inputVideoSource')
+
+    def get_media_slots(self):
+        workingset = self._get("media/workingset", base_url=self._api_url).get('workingset') or []
+        return [MediaSlot(
+            index=slot.get('index'),
+            device_name=slot.get('deviceName'),
+            volume=slot.get('volume'),
+            remaining_record_time=slot.get('remainingRecordTime') or 0,
+            active=bool(slot.get('activeDisk'))) for slot in workingset if slot.get('index') is not None]
+
+    # Record to the slot at index in the working set from now on
+    def set_active_slot(self, index):
+        self._put("media/active", {'workingsetIndex': index}, base_url=self._api_url)
+
+    def close(self):
+        self._session.close()
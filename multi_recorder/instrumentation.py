@@ -0,0 +1,213 @@
+import bisect, json, os, threading, time
+from collections import deque
+from contextlib import contextmanager
+
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+PERCENTILES = (0.5, 0.95, 0.99)
+
+# Latency histogram with cumulative bucket counts for Prometheus, plus a window of the most
+# recent samples that p50/p95/p99 are read from, so percentiles follow what is happening now.
+# Not thread safe on its own, Metrics guards it.
+class LatencyHistogram:
+    def __init__(self, window=1024):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.errors = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds, error=False):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.errors += error
+        self.recent.append(seconds)
+
+    def percentiles(self):
+        recent = sorted(self.recent)
+        if not recent:
+            return {f"p{round(p * 100)}": None for p in PERCENTILES}
+        return {f"p{round(p * 100)}": recent[min(len(recent) - 1, int(len(recent) * p))] for p in PERCENTILES}
+
+    def summary(self):
+        return {'count': self.count, 'errors': self.errors, 'sum': self.sum, **self.percentiles()}
+
+# Request latencies and errors per device and operation, and where the time in each GUI frame goes
+class Metrics:
+    def __init__(self, window=1024, device_smoothing=0.05):
+        self.window = window
+        self.device_smoothing = device_smoothing
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._frame_phases = {}
+        self._frame_devices = {}
+        self.frames = 0
+
+    def observe_request(self, device, operation, seconds, error=False):
+        with self._lock:
+            histogram = self._requests.get((device, operation))
+            if histogram is None:
+                histogram = self._requests[(device, operation)] = LatencyHistogram(self.window)
+            histogram.observe(seconds, error)
+
+    # Time a request to a device, an exception counts as an error and is re-raised
+    @contextmanager
+    def time_request(self, device, operation):
+        started = time.perf_counter()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.observe_request(device, operation, time.perf_counter() - started, error)
+
+    # Record one frame, phases and devices map names to the seconds spent on them. Time per device is
+    # kept as a moving average rather than a histogram, there can be a lot of devices every frame.
+    def observe_frame(self, phases, devices):
+        with self._lock:
+            self.frames += 1
+            for phase, seconds in phases.items():
+                histogram = self._frame_phases.get(phase)
+                if histogram is None:
+                    histogram = self._frame_phases[phase] = LatencyHistogram(self.window)
+                histogram.observe(seconds)
+            for device, seconds in devices.items():
+                average = self._frame_devices.get(device)
+                self._frame_devices[device] = seconds if average is None else average + (seconds - average) * self.device_smoothing
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': [{'device': device, 'operation': operation, **histogram.summary()}
+                             for (device, operation), histogram in sorted(self._requests.items())],
+                'frames': self.frames,
+                'frame_phases': {phase: histogram.summary() for phase, histogram in self._frame_phases.items()},
+                'frame_devices': dict(sorted(self._frame_devices.items(), key=lambda item: item[1], reverse=True)),
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    # Prometheus text exposition format
+    def to_prometheus(self):
+        with self._lock:
+            requests = list(self._requests.items())
+            phases = list(self._frame_phases.items())
+            devices = list(self._frame_devices.items())
+
+        lines = ["# HELP multirecorder_request_seconds Latency of requests to devices.",
+                 "# TYPE multirecorder_request_seconds histogram"]
+        for (device, operation), histogram in requests:
+            lines += _histogram_lines("multirecorder_request_seconds", f'device="{_escape(device)}",operation="{_escape(operation)}"', histogram)
+        lines += ["# HELP multirecorder_request_errors_total Requests to devices that failed.",
+                  "# TYPE multirecorder_request_errors_total counter"]
+        for (device, operation), histogram in requests:
+            lines.append(f'multirecorder_request_errors_total{{device="{_escape(device)}",operation="{_escape(operation)}"}} {histogram.errors}')
+        lines += ["# HELP multirecorder_frame_phase_seconds Time spent in each phase of a GUI frame.",
+                  "# TYPE multirecorder_frame_phase_seconds histogram"]
+        for phase, histogram in phases:
+            lines += _histogram_lines("multirecorder_frame_phase_seconds", f'phase="{_escape(phase)}"', histogram)
+        lines += ["# HELP multirecorder_frame_device_seconds Moving average of the time each GUI frame spends on a device.",
+                  "# TYPE multirecorder_frame_device_seconds gauge"]
+        for device, seconds in devices:
+            lines.append(f'multirecorder_frame_device_seconds{{device="{_escape(device)}"}} {seconds}')
+        return "\n".join(lines) + "\n"
+
+def _histogram_lines(name, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS + ("+Inf",), histogram.buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+# Shared by every device client and the GUI, so there's one place to read measurements from
+METRICS = Metrics()
+
+# Splits the time in a GUI frame into phases, and the time in device loops into devices.
+# phase(name) charges everything since the previous phase to name, wrapping a device loop
+# with devices() charges each iteration to its device.
+class FrameProfiler:
+    def __init__(self, metrics=METRICS):
+        self.metrics = metrics
+        self._phases = {}
+        self._devices = {}
+        self._phase_mark = time.perf_counter()
+        self._device_mark = self._phase_mark
+
+    def phase(self, name):
+        now = time.perf_counter()
+        self._phases[name] = self._phases.get(name, 0.0) + now - self._phase_mark
+        self._phase_mark = self._device_mark = now
+
+    def devices(self, devices):
+        for device in devices:
+            yield device
+            now = time.perf_counter()
+            self._devices[device.key] = self._devices.get(device.key, 0.0) + now - self._device_mark
+            self._device_mark = now
+
+    def end_frame(self):
+        self.metrics.observe_frame(self._phases, self._devices)
+        self._phases = {}
+        self._devices = {}
+
+# Plain text summary of a Metrics snapshot, for the diagnostics panel
+def format_report(snapshot, top=10):
+    def ms(seconds):
+        return f"{seconds * 1000:7.2f}" if seconds is not None else "      -"
+
+    lines = ["Frame phases (ms)           p50     p95     p99"]
+    for phase, summary in snapshot['frame_phases'].items():
+        lines.append(f"  {phase:<22} {ms(summary['p50'])} {ms(summary['p95'])} {ms(summary['p99'])}")
+
+    lines.append("Slowest devices per frame (ms)")
+    for device, seconds in list(snapshot['frame_devices'].items())[:top]:
+        lines.append(f"  {device:<30} {seconds * 1000:7.3f}")
+
+    lines.append("Slowest requests (ms)                        p50     p95     p99  errors")
+    requests = sorted(snapshot['requests'], key=lambda request: request['p95'] or 0, reverse=True)
+    for request in requests[:top]:
+        name = f"{request['device']} {request['operation']}"
+        lines.append(f"  {name[:42]:<42} {ms(request['p50'])} {ms(request['p95'])} {ms(request['p99'])} {request['errors']:>7}")
+    return "\n".join(lines)
+
+# Writes METRICS to a file every interval seconds, as Prometheus text if the file ends in .prom or
+# .txt and JSON otherwise. The file is replaced in one step so readers never see a partial dump.
+class MetricsDumper:
+    def __init__(self, path, interval=10, metrics=METRICS):
+        self.path = path
+        self.interval = interval
+        self.metrics = metrics
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics_dumper", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1)
+        self.dump()
+
+    def dump(self):
+        prometheus = os.path.splitext(self.path)[1] in (".prom", ".txt")
+        text = self.metrics.to_prometheus() if prometheus else self.metrics.to_json()
+        temp_path = f"{self.path}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                f.write(text)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Failed to write metrics to {self.path}: {e}")
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.dump()
@@ -0,0 +1,42 @@
+import argparse, datetime
+from session_journal import read_journal, summarize
+
+# Summarize the recording sessions in MultiRecorder session journals: when each device started
+# relative to the others, how far its timecode drifted from the host clock, pauses, dropouts and
+# the round trip of the command that started it.
+# Usage: python journal_summary.py journals/multirecorder_20261018_140305.journal
+
+def ms(seconds, sign=True):
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:+.1f} ms" if sign else f"{seconds * 1000:.1f} ms"
+
+def print_session(number, session):
+    started = datetime.datetime.fromtimestamp(session.wall_start).strftime("%Y-%m-%d %H:%M:%S") if session.wall_start is not None else "unknown time"
+    duration = str(datetime.timedelta(seconds=round(session.end - session.start)))
+    print(f"Session {number}: {started}, {duration}, {len(session.devices)} device{'s' if len(session.devices) != 1 else ''}")
+    print(f"  Start skew: {ms(session.start_skew, sign=False)} from timecodes, {ms(session.dispatch_skew, sign=False)} between commands sent")
+
+    starts = [device.estimated_start for device in session.devices.values() if device.estimated_start is not None]
+    first_start = min(starts, default=None)
+    print(f"  {'device':<24} {'start':>10} {'drift':>10} {'ppm':>8} {'pauses':>7} {'dropouts':>9} {'round trip':>11}")
+    for device in sorted(session.devices.values(), key=lambda device: device.name):
+        start = device.estimated_start - first_start if device.estimated_start is not None else None
+        ppm = f"{device.drift_ppm:+.0f}" if device.drift_ppm is not None else "-"
+        print(f"  {device.name[:24]:<24} {ms(start):>10} {ms(device.drift if device.span else None):>10} {ppm:>8} "
+              f"{device.pauses:>7} {device.dropouts:>9} {ms(device.round_trip, sign=False):>11}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="journal_summary")
+    parser.add_argument('journals', nargs='+', help='Session journal files written with --journal-dir.')
+    args = parser.parse_args()
+
+    number = 0
+    for path in args.journals:
+        print(path)
+        sessions = summarize(read_journal(path))
+        if not sessions:
+            print("  No recordings")
+        for session in sessions:
+            number += 1
+            print_session(number, session)
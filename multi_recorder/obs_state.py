@@ -0,0 +1,161 @@
+import threading, time
+import obsws_python as obs
+from device_metadata import MetadataCache, fetch_obs_metadata
+from device_poller import DeviceStatus
+from instrumentation import METRICS
+
+# RecordStateChanged output states
+OUTPUT_STARTED = "OBS_WEBSOCKET_OUTPUT_STARTED"
+OUTPUT_STOPPED = "OBS_WEBSOCKET_OUTPUT_STOPPED"
+OUTPUT_PAUSED = "OBS_WEBSOCKET_OUTPUT_PAUSED"
+OUTPUT_RESUMED = "OBS_WEBSOCKET_OUTPUT_RESUMED"
+
+# Format a duration in milliseconds the same way OBS formats output_timecode
+def format_timecode(duration_ms):
+    duration_ms = int(max(0, duration_ms))
+    hours, remainder = divmod(duration_ms, 3600000)
+    minutes, remainder = divmod(remainder, 60000)
+    seconds, milliseconds = divmod(remainder, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02}.{milliseconds:03}"
+
+# ReqClient that serializes requests, so the poller threads and GUI callbacks can share one websocket.
+# Each request is timed into METRICS under key, not counting time spent waiting for the lock.
+class LockedReqClient(obs.ReqClient):
+    def __init__(self, key, **kwargs):
+        self.key = key
+        self._send_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def send(self, param, data=None, raw=False):
+        with self._send_lock, METRICS.time_request(self.key, param):
+            return super().send(param, data, raw)
+
+# Local cache of an OBS instance's recording state, kept current by OBS events instead of
+# per-frame requests. The recording length is interpolated locally and only resynced with a
+# GetRecordStatus request every resync_interval seconds. If the event connection can't be
+# established the cache falls back to resyncing on every read. Once a request fails the
+# connection is considered lost, and the next status() call reconnects before resyncing.
+# on_change, if set, is called from the event thread after an event changed the cache.
+class ObsState:
+    def __init__(self, host, port, resync_interval=5, timeout=1, metadata_ttl=60, key=None):
+        self.host = host
+        self.port = port
+        self.key = key or f"obs:{host}:{port}"
+        self.timeout = timeout
+        self.default_resync_interval = resync_interval
+        self.client = None
+        self.events = None
+        self.metadata = MetadataCache(lambda: fetch_obs_metadata(self.client), ttl=metadata_ttl)
+        self._lock = threading.Lock()
+        self._recording = False
+        self._paused = False
+        self._duration_ms = 0
+        self._synced_at = 0.0
+        self._error = ""
+        self._connected = False
+        self.on_change = None
+
+        self.connect()
+
+    # Open the request and event connections and read the initial state
+    def connect(self):
+        self.close()
+        self.client = LockedReqClient(key=self.key, host=self.host, port=self.port, timeout=self.timeout)
+        self.resync_interval = self.default_resync_interval
+
+        try:
+            self.events = obs.EventClient(host=self.host, port=self.port, timeout=self.timeout, subs=obs.Subs.OUTPUTS | obs.Subs.CONFIG | obs.Subs.GENERAL)
+            self.events.callback.register([self.on_record_state_changed, self.on_current_profile_changed, self.on_exit_started])
+        except Exception as e:
+            print(f"Failed to subscribe to OBS events @ {self.host}:{self.port}, falling back to polling: {e}")
+            self.events = None
+            self.resync_interval = 0
+
+        try:
+            self.resync()
+            self.metadata.refresh()
+        except Exception:
+            self.close()
+            raise
+        self._connected = True
+
+    # Request the current recording status from OBS
+    def resync(self):
+        status = self.client.get_record_status()
+        with self._lock:
+            self._recording = status.output_active
+            self._paused = status.output_paused
+            self._duration_ms = status.output_duration
+            self._synced_at = time.monotonic()
+            self._error = ""
+
+    # Current recording length in milliseconds, interpolated since the last sync
+    def duration_ms(self):
+        with self._lock:
+            return self._interpolated_duration_ms(time.monotonic())
+
+    def _interpolated_duration_ms(self, now):
+        if self._recording and not self._paused:
+            return self._duration_ms + (now - self._synced_at) * 1000
+        return self._duration_ms
+
+    # Build a DeviceStatus from the cache, reconnecting or resyncing first if needed
+    def status(self):
+        if not self._connected:
+            self.connect()
+        elif self._error or time.monotonic() - self._synced_at >= self.resync_interval:
+            try:
+                self.resync()
+            except Exception:
+                self._connected = False
+                raise
+        metadata = self.metadata.get()
+        with self._lock:
+            return DeviceStatus(
+                reachable=True,
+                recording=self._recording,
+                paused=self._paused,
+                timecode=format_timecode(self._interpolated_duration_ms(time.monotonic())),
+                metadata=metadata,
+                updated=time.monotonic())
+
+    def close(self):
+        self._connected = False
+        for connection in (self.events, self.client):
+            if connection is not None:
+                try:
+                    connection.disconnect()
+                except Exception:
+                    pass
+        self.events = None
+
+    # Event callbacks, names must match obsws_python's on_<event_name> convention
+    def on_record_state_changed(self, data):
+        now = time.monotonic()
+        with self._lock:
+            if data.output_state == OUTPUT_STARTED:
+                self._recording, self._paused = True, False
+                self._duration_ms, self._synced_at = 0, now
+            elif data.output_state == OUTPUT_PAUSED:
+                self._duration_ms, self._synced_at = self._interpolated_duration_ms(now), now
+                self._paused = True
+            elif data.output_state == OUTPUT_RESUMED:
+                self._paused, self._synced_at = False, now
+            elif data.output_state == OUTPUT_STOPPED:
+                self._recording, self._paused = False, False
+                self._duration_ms, self._synced_at = 0, now
+        self._changed()
+
+    # Video settings belong to the profile, so re-read them the next time they are needed
+    def on_current_profile_changed(self, data):
+        self.metadata.invalidate()
+        self._changed()
+
+    def on_exit_started(self, data):
+        with self._lock:
+            self._error = "OBS is shutting down"
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
@@ -0,0 +1,138 @@
+import base64, io, threading, time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+# Width previews are displayed at in the GUI
+PREVIEW_WIDTH = 400
+
+# Decoded preview frame, data is a flat contiguous float32 RGBA buffer in the range 0-1
+# that can be passed straight to dpg.add_dynamic_texture or dpg.set_value
+class PreviewFrame:
+    __slots__ = ("width", "height", "data")
+
+    def __init__(self, width, height, data):
+        self.width = width
+        self.height = height
+        self.data = data
+
+# Strip the data URI prefix OBS puts in front of screenshot image data
+def strip_data_uri(image_data):
+    if image_data.startswith("data:"):
+        return image_data[image_data.index(",") + 1:]
+    return image_data
+
+# Decode a base64 encoded image into a PreviewFrame. If max_width is given, images wider than
+# it are downscaled to that width, JPEGs are reduced while decoding which is much cheaper.
+def decode_preview(base64_string, max_width=None):
+    image = Image.open(io.BytesIO(base64.b64decode(base64_string)))
+
+    if max_width is not None and image.width > max_width:
+        height = max(1, round(image.height * max_width / image.width))
+        image.draft("RGB", (max_width, height))
+        if image.width != max_width:
+            image = image.resize((max_width, height), Image.BILINEAR)
+
+    rgba = np.asarray(image.convert("RGBA"), dtype=np.float32).reshape(-1)
+    rgba *= 1 / 255
+    return PreviewFrame(image.width, image.height, rgba)
+
+# Black frame to show when a preview couldn't be captured
+def blank_preview(width, height):
+    data = np.zeros(width * height * 4, dtype=np.float32)
+    data[3::4] = 1
+    return PreviewFrame(width, height, data)
+
+# Request a screenshot of the current program scene from an OBS client and decode it. OBS scales
+# the screenshot down before sending it, so only width x height pixels cross the network.
+def capture_preview(client, width, height, quality=10):
+    program_scene = client.get_current_program_scene()
+    screenshot = client.get_source_screenshot(name=program_scene.current_program_scene_name, img_format='jpg',
+                                              width=width, height=height, quality=quality)
+    return decode_preview(strip_data_uri(screenshot.image_data), max_width=width)
+
+# Keeps previews live by capturing and decoding frames on a worker pool, off the GUI thread.
+# Each source has at most one capture in flight, if a source can't keep up with its rate its
+# frames are skipped rather than queued. max_total_fps caps captures across all sources so a
+# large number of sources can't saturate the network or CPU.
+class LivePreviewer:
+    def __init__(self, max_total_fps=10, max_workers=4, tick=0.01):
+        self.max_total_fps = max_total_fps
+        self._tick = tick
+        self._sources = {}
+        self._next_capture = {}
+        self._in_flight = set()
+        self._frames = {}
+        self._tokens = max_total_fps
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preview")
+        self._thread = threading.Thread(target=self._run, name="live_previewer", daemon=True)
+
+    # capture_fn is called on a worker thread and returns a PreviewFrame. Frames that don't
+    # match width x height are dropped, the texture they'd be swapped into has a fixed size.
+    # A rate of 0 or less turns live previews off for the source, it keeps whatever frame it has.
+    def add_source(self, key, capture_fn, rate, width, height):
+        if rate <= 0:
+            self.remove_source(key)
+            return
+        with self._lock:
+            self._sources[key] = (capture_fn, 1 / rate, width, height)
+            self._next_capture[key] = 0.0
+
+    def remove_source(self, key):
+        with self._lock:
+            self._sources.pop(key, None)
+            self._next_capture.pop(key, None)
+            self._frames.pop(key, None)
+
+    # Frames captured since the last call, as a dict of key to PreviewFrame
+    def take_frames(self):
+        with self._lock:
+            frames, self._frames = self._frames, {}
+        return frames
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=1)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            with self._lock:
+                self._tokens = min(self.max_total_fps, self._tokens + (now - self._refilled_at) * self.max_total_fps)
+                self._refilled_at = now
+                # Longest overdue first, so every source gets a share of the budget
+                due = sorted((next_capture, key) for key, next_capture in self._next_capture.items()
+                             if next_capture <= now and key not in self._in_flight)
+                submit = []
+                for _, key in due:
+                    if self._tokens < 1:
+                        break
+                    self._tokens -= 1
+                    self._in_flight.add(key)
+                    submit.append((key, *self._sources[key]))
+            for key, capture_fn, interval, width, height in submit:
+                self._executor.submit(self._capture, key, capture_fn, interval, width, height)
+            self._stop_event.wait(self._tick)
+
+    def _capture(self, key, capture_fn, interval, width, height):
+        started = time.monotonic()
+        try:
+            frame = capture_fn()
+        except Exception:
+            frame = None
+        with self._lock:
+            self._in_flight.discard(key)
+            if key not in self._sources:
+                return
+            # Schedule from when the capture started, a slow capture skips frames instead of bunching them up
+            self._next_capture[key] = max(started + interval, time.monotonic())
+            if frame is not None and frame.width == width and frame.height == height:
+                self._frames[key] = frame
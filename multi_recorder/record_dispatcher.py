@@ -0,0 +1,94 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# Outcome of a dispatched command for a single device
+@dataclass(frozen=True)
+class DispatchResult:
+    name: str
+    sent: bool = False
+    error: str = ""
+    sent_at: float = 0.0
+    done_at: float = 0.0
+    key: str = ""
+
+    @property
+    def round_trip(self):
+        return self.done_at - self.sent_at
+
+# A device the dispatcher should act on. needs_command() checks the device state and returns
+# whether command() should be sent, both are called from worker threads.
+@dataclass(frozen=True)
+class DispatchTarget:
+    name: str
+    needs_command: object
+    command: object
+    key: str = ""
+
+# Check every target in parallel, then release all of the commands at once behind a barrier
+# so the devices receive them as close together as possible. If before_release is given it is
+# called once every check is done and every command is waiting, and the commands are released
+# when it returns, which lets several dispatches in other processes be released together. It may
+# take up to release_timeout seconds, which the waiting commands allow for on top of timeout.
+def dispatch(targets, timeout=5, before_release=None, release_timeout=0):
+    if not targets:
+        if before_release is not None:
+            before_release()
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(targets), thread_name_prefix="dispatch") as executor:
+        checks = list(executor.map(_check, targets))
+
+        results = [DispatchResult(name=target.name, error=error, key=target.key) for target, (_, error) in zip(targets, checks)]
+        pending = [i for i, (needed, error) in enumerate(checks) if needed and not error]
+
+        if pending:
+            barrier = threading.Barrier(len(pending), action=before_release)
+            futures = {i: executor.submit(_send, targets[i], barrier, timeout + release_timeout) for i in pending}
+            for i, future in futures.items():
+                results[i] = future.result()
+            if barrier.broken:
+                print(f"Dispatch timed out waiting for every command to be ready, {len(pending)} commands were sent as soon as they could be")
+        elif before_release is not None:
+            before_release()
+
+    return results
+
+def _check(target):
+    try:
+        return bool(target.needs_command()), ""
+    except Exception as e:
+        return False, str(e)
+
+def _send(target, barrier, timeout):
+    try:
+        barrier.wait(timeout=timeout)
+    except threading.BrokenBarrierError:
+        # Another worker timed out, still send the command rather than drop it
+        pass
+    sent_at = time.perf_counter()
+    try:
+        target.command()
+    except Exception as e:
+        return DispatchResult(name=target.name, error=str(e), sent_at=sent_at, done_at=time.perf_counter(), key=target.key)
+    return DispatchResult(name=target.name, sent=True, sent_at=sent_at, done_at=time.perf_counter(), key=target.key)
+
+# Difference between the first and last command sent, in seconds
+def start_skew(results):
+    sent = [result.sent_at for result in results if result.sent]
+    if len(sent) < 2:
+        return 0.0
+    return max(sent) - min(sent)
+
+# Print a per-device summary of a dispatch
+def print_report(action, results):
+    sent = [result for result in results if result.sent]
+    failed = [result for result in results if result.error]
+    print(f"{action}: {len(sent)} sent, {len(results) - len(sent) - len(failed)} unchanged, {len(failed)} failed, "
+          f"skew {start_skew(results) * 1000:.1f} ms")
+    first_sent = min((result.sent_at for result in sent), default=0.0)
+    for result in results:
+        if result.sent:
+            print(f" - {result.name}: +{(result.sent_at - first_sent) * 1000:.1f} ms, round trip {result.round_trip * 1000:.1f} ms")
+        elif result.error:
+            print(f" - {result.name}: failed: {result.error}")
@@ -0,0 +1,272 @@
+import os, socket, threading, time
+from collections import deque
+from dataclasses import dataclass, field
+
+JOURNAL_VERSION = 1
+
+# Append-only journal of what every device did during a run of MultiRecorder, for syncing footage in
+# post and for reviewing incidents. One tab separated line per entry, times are host monotonic seconds:
+#   H  <time> <wall clock> <version> <host>           header, maps monotonic times to wall clock times
+#   D  <time> <key> <kind> <name>                     a device appeared
+#   S  <time> <key> <state> <timecode> [<error>]      state change: up, down, rec, stop, pause, resume or gone
+#   T  <time> <key> <timecode> <fps>                  timecode sample while recording
+#   C  <time> <key> <action> <outcome> <round trip ms> [<error>]   Record All / Stop All command, at the time it was sent
+# Entries are queued by a device store listener as each status arrives, so no transition is missed
+# however brief, and written in batches on the journal's own thread, so the render loop and pollers
+# never wait on the disk. Times are when the status was read from the device.
+class SessionJournal:
+    def __init__(self, manager, path, sample_interval=1, flush_interval=1):
+        self.manager = manager
+        self.path = path
+        self.sample_interval = sample_interval
+        self.flush_interval = flush_interval
+        self._pending = deque()
+        self._states = {}
+        self._sampled = {}
+        self._file = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="session_journal", daemon=True)
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8", buffering=64 * 1024)
+        self._pending.append(_line("H", time.monotonic(), f"{time.time():.6f}", JOURNAL_VERSION, socket.gethostname()))
+        self.manager.store.add_listener(self._status_changed)
+        self._thread.start()
+
+    def stop(self):
+        self.manager.store.remove_listener(self._status_changed)
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=2)
+
+    # Queue the commands of a Record All / Stop All, from whichever thread dispatched them. Dispatch
+    # times are perf_counter times, the offset to monotonic is taken now since both clocks are steady.
+    def log_dispatch(self, action, results):
+        offset = time.monotonic() - time.perf_counter()
+        for result in results:
+            if result.sent:
+                self._pending.append(_line("C", result.sent_at + offset, result.key, action, "sent", f"{result.round_trip * 1000:.1f}"))
+            elif result.error:
+                self._pending.append(_line("C", (result.sent_at or time.perf_counter()) + offset, result.key, action, "failed",
+                                           f"{result.round_trip * 1000:.1f}" if result.sent_at else "", result.error))
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+        self._file.close()
+
+    # Compare a status against the last one journaled for its device and queue what changed. Called
+    # by the store with it locked, status is None once the device is removed.
+    def _status_changed(self, key, status):
+        if status is None:
+            if key in self._states:
+                self._pending.append(_line("S", time.monotonic(), key, "gone", ""))
+                del self._states[key]
+                self._sampled.pop(key, None)
+            return
+        # Not polled yet
+        if not status.updated:
+            return
+        previous = self._states.get(key)
+        if previous is None:
+            device = next((device for device in self.manager.devices if device.key == key), None)
+            self._pending.append(_line("D", status.updated, key, device.kind if device else "", device.name if device else key))
+            previous = (False, False, False)
+        reachable = status.reachable
+        recording = reachable and status.recording
+        paused = recording and status.paused
+        if previous[0] != reachable:
+            self._pending.append(_line("S", status.updated, key, "up" if reachable else "down", status.timecode, status.error))
+        if reachable:
+            if previous[1] != recording:
+                self._pending.append(_line("S", status.updated, key, "rec" if recording else "stop", status.timecode))
+                self._sampled[key] = status.updated
+            elif recording and previous[2] != paused:
+                self._pending.append(_line("S", status.updated, key, "pause" if paused else "resume", status.timecode))
+                self._sampled[key] = status.updated
+            elif recording and not paused and status.updated - self._sampled.get(key, 0.0) >= self.sample_interval:
+                fps = status.metadata.fps if status.metadata is not None and status.metadata.fps is not None else ""
+                self._pending.append(_line("T", status.updated, key, status.timecode, fps))
+                self._sampled[key] = status.updated
+            self._states[key] = (reachable, recording, paused)
+        else:
+            # Keep the last known recording state, the device may well still be recording
+            self._states[key] = (False, previous[1], previous[2])
+
+    def _flush(self):
+        if not self._pending:
+            return
+        lines = []
+        while self._pending:
+            lines.append(self._pending.popleft())
+        try:
+            self._file.write("".join(lines))
+            self._file.flush()
+        except OSError as e:
+            print(f"Failed to write to journal {self.path}: {e}")
+
+def _field(value):
+    return str(value).replace("\t", " ").replace("\n", " ").replace("\r", " ")
+
+# Trailing empty fields are left off to keep lines short
+def _line(kind, at, *fields):
+    fields = list(fields)
+    while fields and fields[-1] in ("", None):
+        fields.pop()
+    return "\t".join([kind, f"{at:.6f}"] + [_field(field) for field in fields]) + "\n"
+
+# Seconds in a timecode, either OBS's HH:MM:SS.mmm or a HyperDeck's HH:MM:SS:FF which needs the frame rate.
+# None if it can't be read.
+def parse_timecode(timecode, fps=None):
+    parts = timecode.replace(";", ":").split(":")
+    try:
+        if len(parts) == 3:
+            return int(parts[0]) * 3600 + int(parts[1]) * 60 + float(parts[2])
+        if len(parts) == 4 and fps:
+            return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2]) + int(parts[3]) / float(fps)
+    except ValueError:
+        pass
+    return None
+
+# Entries of a journal as (kind, time, fields), one list per run of MultiRecorder in time order
+def read_journal(path):
+    runs = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 2:
+                continue
+            try:
+                entry = (parts[0], float(parts[1]), parts[2:])
+            except ValueError:
+                continue
+            if entry[0] == "H" or not runs:
+                runs.append([])
+            runs[-1].append(entry)
+    # Entries are written as they're noticed, which isn't quite the order they happened in
+    return [sorted(run, key=lambda entry: entry[1]) for run in runs]
+
+# One device's part in a recording session. Drift compares how far the device's timecode moved
+# against how far the host clock moved while it was recording and not paused.
+@dataclass
+class DeviceSession:
+    key: str
+    name: str
+    started: float = None
+    stopped: float = None
+    estimated_start: float = None
+    drift: float = 0.0
+    span: float = 0.0
+    pauses: int = 0
+    dropouts: int = 0
+    round_trip: float = None
+    segment: list = field(default_factory=list)
+
+    @property
+    def drift_ppm(self):
+        return self.drift / self.span * 1e6 if self.span > 0 else None
+
+    def sample(self, at, timecode, fps=None):
+        seconds = parse_timecode(timecode, fps) if timecode else None
+        if seconds is None:
+            return
+        # A timecode is read some time before it arrives and only counts whole frames, so each sample only
+        # bounds the start from above and the tightest bound until the first pause is used
+        if self.pauses == 0:
+            self.estimated_start = min(at - seconds, self.estimated_start if self.estimated_start is not None else at - seconds)
+        self.segment.append((at, seconds))
+
+    def end_segment(self):
+        if len(self.segment) > 1:
+            (first_at, first_seconds), (last_at, last_seconds) = self.segment[0], self.segment[-1]
+            self.drift += (last_seconds - first_seconds) - (last_at - first_at)
+            self.span += last_at - first_at
+        self.segment = []
+
+# From the first device starting to record until every device has stopped
+@dataclass
+class RecordingSession:
+    start: float
+    wall_start: float
+    end: float = None
+    devices: dict = field(default_factory=dict)
+    dispatch_skew: float = None
+
+    # Spread of when the devices started recording, worked out from their timecodes. Only meaningful
+    # when the timecodes count from the start of the recording.
+    @property
+    def start_skew(self):
+        starts = [device.estimated_start for device in self.devices.values() if device.estimated_start is not None]
+        return max(starts) - min(starts) if len(starts) > 1 else None
+
+# Split the runs of a journal into recording sessions. Record All commands sent shortly before a
+# session started are counted as the ones that started it.
+def summarize(runs, dispatch_window=5):
+    sessions = []
+    for run in runs:
+        header = next(((at, fields) for kind, at, fields in run if kind == "H"), None)
+        wall_offset = float(header[1][0]) - header[0] if header else None
+        run_sessions = []
+        names = {}
+        session = None
+        commands = []
+        last_at = None
+        for kind, at, fields in run:
+            last_at = at
+            if kind == "D":
+                names[fields[0]] = fields[2] if len(fields) > 2 else fields[0]
+            elif kind == "C":
+                if len(fields) > 2 and fields[1] == "record":
+                    commands.append((at, fields[0], fields[2], float(fields[3]) / 1000 if len(fields) > 3 and fields[3] else None))
+            elif kind == "S":
+                key, state, timecode = fields[0], fields[1], fields[2] if len(fields) > 2 else ""
+                if state == "rec":
+                    if session is None:
+                        session = RecordingSession(start=at, wall_start=at + wall_offset if wall_offset is not None else None)
+                        run_sessions.append(session)
+                    device = session.devices.setdefault(key, DeviceSession(key=key, name=names.get(key, key)))
+                    device.started = at if device.started is None else device.started
+                    device.stopped = None
+                    device.sample(at, timecode)
+                elif session is None or key not in session.devices:
+                    continue
+                elif state in ("stop", "gone"):
+                    device = session.devices[key]
+                    if device.stopped is None:
+                        device.stopped = at
+                        device.end_segment()
+                    if all(device.stopped is not None for device in session.devices.values()):
+                        session.end = at
+                        session = None
+                elif state == "pause":
+                    session.devices[key].pauses += 1
+                    session.devices[key].end_segment()
+                elif state == "resume":
+                    session.devices[key].sample(at, timecode)
+                elif state == "down":
+                    session.devices[key].dropouts += 1
+            elif kind == "T" and session is not None and fields[0] in session.devices:
+                session.devices[fields[0]].sample(at, fields[1], fields[2] if len(fields) > 2 else None)
+        # Still recording when the journal ends
+        if session is not None:
+            for device in session.devices.values():
+                device.end_segment()
+            session.end = last_at
+        for session in run_sessions:
+            _attach_commands(session, commands, dispatch_window)
+        sessions += run_sessions
+    return sessions
+
+def _attach_commands(session, commands, dispatch_window):
+    sent = [(at, key, round_trip) for at, key, outcome, round_trip in commands
+            if outcome == "sent" and session.start - dispatch_window <= at <= session.start + 1]
+    if not sent:
+        return
+    session.dispatch_skew = max(at for at, _, _ in sent) - min(at for at, _, _ in sent)
+    for _, key, round_trip in sent:
+        if key in session.devices:
+            session.devices[key].round_trip = round_trip
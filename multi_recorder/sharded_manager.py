@@ -0,0 +1,483 @@
+import os, secrets, subprocess, sys, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+import record_dispatcher
+from device_manager import ConfigChanges, DeviceManager, blackmagic_key, diff_connections, obs_key, print_prepare_report
+from device_metadata import DeviceMetadata
+from device_poller import DeviceStatus
+from startup import StartupResult
+
+AUTHKEY_ENV = "MULTIRECORDER_SHARD_AUTHKEY"
+SHARD_WORKER_ARG = "--shard-worker"
+
+# Devices are split across worker processes that each run their own DeviceManager, so connecting,
+# polling and parsing for a large fleet is spread over several cores instead of competing with the
+# GUI for one. Workers are started as separate scripts and talk to the GUI process over a local
+# multiprocessing connection:
+#
+#   worker -> GUI   ("connected", devices, failed conns, startup results)
+#                   ("status", [(key, reachable, recording, paused, timecode, error, metadata)])
+#                   ("result", call id, value, error)
+#                   ("ready",)        every record/stop command of a dispatch is waiting
+#                   ("added", devices) connections that failed at startup and have since connected
+#   GUI -> worker   (cfg, settings)   the worker's share of the config
+#                   ("call", call id, method, args)
+#                   ("go",)           release the waiting dispatch commands
+#                   ("stop",)
+#
+# Status messages only carry devices whose status changed, and metadata only when it was refetched.
+
+# Time between status messages from a worker, changes in between are sent together
+DELTA_INTERVAL = 0.01
+# Longest a worker holds its dispatch commands waiting for the GUI process to release them
+GO_TIMEOUT = 5
+
+# Command line that starts a worker. A standalone build has no python or sharded_manager.py to run,
+# there the executable is MultiRecorder itself, which hands SHARD_WORKER_ARG to run_worker.
+def worker_command(port, index):
+    if "__compiled__" in globals() or getattr(sys, "frozen", False):
+        return [sys.executable, SHARD_WORKER_ARG, str(port), str(index)]
+    return [sys.executable, os.path.abspath(__file__), str(port), str(index)]
+
+# perf_counter times can't be compared across processes, dispatch times are sent as wall clock times
+def _to_wall(perf_time):
+    return time.time() - (time.perf_counter() - perf_time)
+
+def _from_wall(wall_time):
+    return time.perf_counter() - (time.time() - wall_time)
+
+# Stand-in for a device owned by a worker process, with the same controls as a local device
+class RemoteDevice:
+    def __init__(self, shard, info):
+        self.shard = shard
+        self.kind = info['kind']
+        self.name = info['name']
+        self.key = info['key']
+        self.address = info['address']
+        self.tags = info['tags']
+        self.conn = info['conn']
+        self.metadata = RemoteMetadata(shard, self.key)
+        self.preview = None
+
+    def toggle_recording(self):
+        self.shard.call("toggle_recording", self.key)
+
+    def toggle_pause(self):
+        self.shard.call("toggle_pause", self.key)
+
+    def set_record_directory(self, directory_path):
+        self.shard.call("set_record_directory", self.key, directory_path)
+
+    def close(self):
+        pass
+
+# Metadata of a remote device, as last sent by its worker. Never fetches in this process.
+class RemoteMetadata:
+    def __init__(self, shard, key):
+        self.shard = shard
+        self.key = key
+
+    def peek(self):
+        return self.shard.manager.store.get(self.key).metadata
+
+    def get(self):
+        return self.peek() or DeviceMetadata()
+
+    def invalidate(self):
+        try:
+            self.shard.send(("call", None, "invalidate_metadata", (self.key,)))
+        except OSError:
+            pass
+
+# The GUI process' end of the connection to one worker
+class Shard:
+    def __init__(self, manager, index, conns):
+        self.manager = manager
+        self.index = index
+        self.conns = conns
+        self.devices = []
+        self.ready = threading.Event()
+        self.alive = False
+        self.process = None
+        self._connection = None
+        self._send_lock = threading.Lock()
+        self._calls = {}
+        self._next_call = 0
+        self._metadata = {}
+        self._reader = threading.Thread(target=self._read, name=f"shard_{index}", daemon=True)
+
+    def send(self, message):
+        with self._send_lock:
+            self._connection.send(message)
+
+    # Call a method on the worker and wait for its result, errors in the worker are raised here
+    def call(self, method, *args, timeout=10):
+        return self.call_async(method, *args).result(timeout=timeout)
+
+    def call_async(self, method, *args):
+        future = Future()
+        if not self.alive:
+            future.set_exception(RuntimeError(f"Shard {self.index} isn't running"))
+            return future
+        with self._send_lock:
+            self._next_call += 1
+            self._calls[self._next_call] = future
+            self._connection.send(("call", self._next_call, method, args))
+        return future
+
+    def attach(self, connection, cfg, settings):
+        self._connection = connection
+        self.send((cfg, settings))
+        message = connection.recv()
+        _, self.devices, failed_conns, startup_results = message
+        self.alive = True
+        self._reader.start()
+        return failed_conns, startup_results
+
+    def _read(self):
+        store = self.manager.store
+        try:
+            while True:
+                message = self._connection.recv()
+                if message[0] == "status":
+                    for key, reachable, recording, paused, timecode, error, metadata in message[1]:
+                        if metadata is not None:
+                            self._metadata[key] = metadata
+                        store.update(key, DeviceStatus(reachable=reachable, recording=recording, paused=paused, timecode=timecode,
+                                                       error=error, metadata=self._metadata.get(key), updated=time.monotonic()))
+                elif message[0] == "result":
+                    _, call_id, value, error = message
+                    future = self._calls.pop(call_id, None)
+                    if future is not None:
+                        future.set_exception(RuntimeError(error)) if error else future.set_result(value)
+                elif message[0] == "ready":
+                    self.ready.set()
+                elif message[0] == "added":
+                    self.manager.add_remote_devices(self, message[1])
+        except (EOFError, OSError):
+            pass
+
+        # The worker is gone, so are its devices
+        self.alive = False
+        for device in self.devices:
+            store.update(device['key'], DeviceStatus(reachable=False, error=f"Shard {self.index} exited", updated=time.monotonic()))
+        for future in list(self._calls.values()):
+            if not future.done():
+                future.set_exception(RuntimeError(f"Shard {self.index} exited"))
+        self.ready.set()
+
+    def close(self):
+        if self.alive:
+            try:
+                self.send(("stop",))
+            except OSError:
+                pass
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+# DeviceManager that spreads its devices over worker processes. The store, device lists and controls
+# work the same as DeviceManager's, so the GUI and control API can use either.
+class ShardedDeviceManager(DeviceManager):
+    def __init__(self, settings, shards=2, dispatch_timeout=5):
+        super().__init__(settings)
+        self.shard_count = shards
+        self.dispatch_timeout = dispatch_timeout
+        self.shards = []
+        self._dispatch_lock = threading.Lock()
+
+    # Deal the config's connections out to the workers round robin, then wait for every worker to connect to its share
+    def connect(self, cfg, report_empty=True):
+        self.obs_connections = cfg.get('obs_connections') or []
+        if len(self.obs_connections) == 0 and report_empty:
+            print("No OBS connections found in config.")
+        self.blackmagic_connections = cfg.get('blackmagic_connections') or []
+        if len(self.blackmagic_connections) == 0 and report_empty:
+            print("No BlackMagic connections found in config.")
+
+        diff = diff_connections({}, cfg)
+        conns = [('obs_connections', conn) for conn in diff.obs_added] + [('blackmagic_connections', conn) for conn in diff.blackmagic_added]
+        shard_count = max(1, min(self.shard_count, len(conns)))
+        self.shards = [Shard(self, index, conns[index::shard_count]) for index in range(shard_count)]
+
+        authkey = secrets.token_bytes(16)
+        listener = Listener(("127.0.0.1", 0), authkey=authkey)
+        env = dict(os.environ, **{AUTHKEY_ENV: authkey.hex()})
+        for shard in self.shards:
+            shard.process = subprocess.Popen(worker_command(listener.address[1], shard.index), env=env)
+
+        # Workers connect in any order and introduce themselves with their index
+        connected = {}
+        def accept():
+            try:
+                while len(connected) < len(self.shards):
+                    connection = listener.accept()
+                    connected[connection.recv()] = connection
+            except (EOFError, OSError):
+                pass
+        accept_thread = threading.Thread(target=accept, name="shard_accept", daemon=True)
+        accept_thread.start()
+        accept_thread.join(timeout=self.settings.startup_timeout + 10)
+        listener.close()
+
+        attached = [(shard, connected[shard.index]) for shard in self.shards if shard.index in connected]
+        results = {}
+        def attach(shard, connection):
+            shard_cfg = {'obs_connections': [], 'blackmagic_connections': []}
+            for section, conn in shard.conns:
+                shard_cfg[section].append(conn)
+            results[shard.index] = shard.attach(connection, shard_cfg, self.settings)
+        with ThreadPoolExecutor(max_workers=max(1, len(attached))) as executor:
+            for future in [executor.submit(attach, shard, connection) for shard, connection in attached]:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Shard failed to start: {e}")
+
+        for shard in self.shards:
+            if shard.index not in results:
+                print(f"Shard {shard.index} failed to start, its connections are unavailable.")
+                self.failed_conns += [conn for _, conn in shard.conns]
+                self.startup_results += [StartupResult(name=conn['name'], error="shard failed to start") for _, conn in shard.conns]
+                continue
+            failed_conns, startup_results = results[shard.index]
+            self.failed_conns += failed_conns
+            self.startup_results += startup_results
+            for info in shard.devices:
+                device = RemoteDevice(shard, info)
+                (self.obs_devices if device.kind == "obs" else self.blackmagic_devices).append(device)
+                self.store.add(device.key, info['status'])
+            # Workers keep retrying their failed connections, their status arrives like any other device's
+            for section, conn in shard.conns:
+                if conn in failed_conns:
+                    self.store.add(obs_key(conn) if section == "obs_connections" else blackmagic_key(conn))
+
+        if len(self.obs_devices) == 0 and len(self.obs_connections) > 0 and report_empty:
+            print("All OBS connections failed.")
+        if len(self.blackmagic_devices) == 0 and len(self.blackmagic_connections) > 0 and report_empty:
+            print("All BlackMagic connections failed.")
+
+    # Workers start polling as soon as they've connected
+    def start(self):
+        pass
+
+    # A worker connected to connections that failed at startup, runs on the shard's reader thread
+    def add_remote_devices(self, shard, infos):
+        devices = [RemoteDevice(shard, info) for info in infos]
+        shard.devices = shard.devices + infos
+        for device, info in zip(devices, infos):
+            self.store.add(device.key, info['status'])
+            self.failed_conns = [conn for conn in self.failed_conns if conn != device.conn]
+        self.obs_devices = self.obs_devices + [device for device in devices if device.kind == "obs"]
+        self.blackmagic_devices = self.blackmagic_devices + [device for device in devices if device.kind == "blackmagic"]
+        if self.on_change is not None:
+            self.on_change(ConfigChanges(added=devices, removed=[], updated=[], failed=[]))
+
+    # Connections are dealt to workers when they start, moving them between workers isn't supported
+    def apply_config(self, cfg):
+        print("Config changes can't be applied with --shards, restart MultiRecorder to apply them")
+        return None
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+    def set_visible(self, keys):
+        self._send_all(("call", None, "set_visible", (keys,)))
+
+    def refresh_metadata(self):
+        self._send_all(("call", None, "refresh_metadata", ()))
+
+    # A worker can exit before its reader notices, so sends to it may still fail here
+    def _send_all(self, message):
+        for shard in self.shards:
+            if shard.alive:
+                try:
+                    shard.send(message)
+                except OSError:
+                    pass
+
+    def record_all(self):
+        results = self._dispatch(recording=True)
+        record_dispatcher.print_report("Record All", results)
+        if self.journal is not None:
+            self.journal.log_dispatch("record", results)
+        return results
+
+    def stop_all(self):
+        results = self._dispatch(recording=False)
+        record_dispatcher.print_report("Stop All", results)
+        if self.journal is not None:
+            self.journal.log_dispatch("stop", results)
+        return results
+
+    # Workers prepare their devices in parallel with each other
+    def prepare_recording(self, record_dir, report=True):
+        shards = [shard for shard in self.shards if shard.alive]
+        futures = [shard.call_async("prepare_recording", record_dir) for shard in shards]
+        results = []
+        for shard, future in zip(shards, futures):
+            try:
+                results += [StartupResult(name=name, value=value, error=error, seconds=seconds)
+                            for name, value, error, seconds in future.result(timeout=self.settings.startup_timeout * 2)]
+            except Exception as e:
+                results += [StartupResult(name=device['name'], error=str(e)) for device in shard.devices]
+        if report:
+            print_prepare_report(record_dir, results)
+        return results
+
+    # Every worker checks its devices and parks its commands, once they're all ready the commands are
+    # released together so the skew across workers is only how long the go messages take to arrive
+    def _dispatch(self, recording):
+        with self._dispatch_lock:
+            shards = [shard for shard in self.shards if shard.alive]
+            for shard in shards:
+                shard.ready.clear()
+            futures = [shard.call_async("dispatch", recording) for shard in shards]
+            deadline = time.monotonic() + self.dispatch_timeout
+            for shard in shards:
+                shard.ready.wait(max(0.0, deadline - time.monotonic()))
+            for shard in shards:
+                try:
+                    shard.send(("go",))
+                except OSError:
+                    pass
+
+            results = []
+            for shard, future in zip(shards, futures):
+                try:
+                    for name, key, sent, error, sent_at, done_at in future.result(timeout=self.dispatch_timeout * 2):
+                        results.append(record_dispatcher.DispatchResult(name=name, sent=sent, error=error, key=key,
+                                                                        sent_at=_from_wall(sent_at), done_at=_from_wall(done_at)))
+                except Exception as e:
+                    results += [record_dispatcher.DispatchResult(name=device['name'], error=str(e), key=device['key']) for device in shard.devices]
+            return results
+
+# Worker process: runs a DeviceManager for its share of the config and streams status changes back
+class ShardWorker:
+    def __init__(self, connection):
+        self.connection = connection
+        self.manager = None
+        self._send_lock = threading.Lock()
+        self._go = threading.Event()
+        self._stop_event = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="shard_call")
+
+    def send(self, message):
+        with self._send_lock:
+            self.connection.send(message)
+
+    def run(self):
+        cfg, settings = self.connection.recv()
+        self.manager = DeviceManager(settings)
+        self.manager.connect(cfg, report_empty=False)
+        devices = [self._device_info(device) for device in self.manager.devices]
+        startup_results = [StartupResult(name=result.name, error=result.error, seconds=result.seconds) for result in self.manager.startup_results]
+        self.send(("connected", devices, self.manager.failed_conns, startup_results))
+        self.manager.on_change = self._devices_added
+        self.manager.start()
+
+        threading.Thread(target=self._send_deltas, name="shard_deltas", daemon=True).start()
+        try:
+            while True:
+                message = self.connection.recv()
+                if message[0] == "stop":
+                    break
+                elif message[0] == "go":
+                    self._go.set()
+                elif message[0] == "call":
+                    _, call_id, method, args = message
+                    self._executor.submit(self._call, call_id, method, args)
+        except (EOFError, OSError):
+            pass
+        self._stop_event.set()
+        self._go.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.manager.close()
+
+    def _device_info(self, device):
+        return {'kind': device.kind, 'name': device.name, 'key': device.key, 'address': device.address,
+                'tags': device.tags, 'conn': device.conn, 'status': self.manager.store.get(device.key)}
+
+    def _devices_added(self, changes):
+        try:
+            self.send(("added", [self._device_info(device) for device in changes.added]))
+        except OSError:
+            pass
+
+    def _call(self, call_id, method, args):
+        try:
+            value, error = getattr(self, f"do_{method}")(*args), ""
+        except Exception as e:
+            value, error = None, str(e) or type(e).__name__
+        if call_id is not None:
+            try:
+                self.send(("result", call_id, value, error))
+            except OSError:
+                pass
+
+    def do_toggle_recording(self, key):
+        self.manager.device(key).toggle_recording()
+
+    def do_toggle_pause(self, key):
+        self.manager.device(key).toggle_pause()
+
+    def do_set_record_directory(self, key, directory_path):
+        self.manager.device(key).set_record_directory(directory_path)
+
+    def do_invalidate_metadata(self, key):
+        self.manager.device(key).metadata.invalidate()
+
+    def do_refresh_metadata(self):
+        self.manager.refresh_metadata()
+
+    def do_set_visible(self, keys):
+        self.manager.set_visible(keys)
+
+    def do_prepare_recording(self, record_dir):
+        results = self.manager.prepare_recording(record_dir, report=False)
+        return [(result.name, result.value, result.error, result.seconds) for result in results]
+
+    def do_dispatch(self, recording):
+        self._go.clear()
+        targets = [device.dispatch_target(recording) for device in self.manager.devices]
+        results = record_dispatcher.dispatch(targets, before_release=self._wait_for_go, release_timeout=GO_TIMEOUT)
+        return [(result.name, result.key, result.sent, result.error, _to_wall(result.sent_at), _to_wall(result.done_at)) for result in results]
+
+    # Tell the GUI process this worker is ready, then hold the commands until every worker is ready
+    def _wait_for_go(self):
+        self.send(("ready",))
+        self._go.wait(timeout=GO_TIMEOUT)
+
+    def _send_deltas(self):
+        store = self.manager.store
+        sent = {}
+        version = None
+        while not self._stop_event.is_set():
+            version = store.wait_for_change(version, timeout=1)
+            changes = []
+            for key, status in store.snapshots().items():
+                previous = sent.get(key)
+                fields = (status.reachable, status.recording, status.paused, status.timecode, status.error)
+                if previous is not None and previous[0] == fields and previous[1] is status.metadata:
+                    continue
+                metadata = status.metadata if previous is None or previous[1] is not status.metadata else None
+                sent[key] = (fields, status.metadata)
+                changes.append((key, *fields, metadata))
+            if changes:
+                try:
+                    self.send(("status", changes))
+                except OSError:
+                    return
+            self._stop_event.wait(DELTA_INTERVAL)
+
+# Connect back to the GUI process listening on port and run as its worker number index
+def run_worker(port, index):
+    connection = Client(("127.0.0.1", port), authkey=bytes.fromhex(os.environ[AUTHKEY_ENV]))
+    connection.send(index)
+    ShardWorker(connection).run()
+
+if __name__ == "__main__":
+    run_worker(int(sys.argv[1]), int(sys.argv[2]))
@@ -0,0 +1,75 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+
+# Outcome of one startup task, value is whatever the task returned
+@dataclass(frozen=True)
+class StartupResult:
+    name: str
+    value: object = None
+    error: str = ""
+    seconds: float = 0.0
+
+    @property
+    def ok(self):
+        return not self.error
+
+# Run every task concurrently and return a StartupResult for each, in the same order. Tasks
+# still running once deadline seconds have passed are reported as timed out. If discard_fn is
+# given it is called with the value of any timed out task that completes later, so late
+# connections can be closed instead of leaked.
+def run_concurrently(tasks, deadline, max_workers=32, discard_fn=None):
+    if not tasks:
+        return []
+
+    executor = ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tasks))), thread_name_prefix="startup")
+    started = time.perf_counter()
+    futures = [executor.submit(_timed, task) for _, task in tasks]
+    wait(futures, timeout=deadline)
+
+    results = []
+    for (name, _), future in zip(tasks, futures):
+        if future.done():
+            value, error, seconds = future.result()
+            results.append(StartupResult(name=name, value=value, error=error, seconds=seconds))
+        else:
+            if discard_fn is not None:
+                future.add_done_callback(lambda future: _discard(future, discard_fn))
+            results.append(StartupResult(name=name, error=f"timed out after {deadline}s", seconds=time.perf_counter() - started))
+    executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def _timed(task):
+    started = time.perf_counter()
+    try:
+        return task(), "", time.perf_counter() - started
+    except Exception as e:
+        return None, str(e) or type(e).__name__, time.perf_counter() - started
+
+def _discard(future, discard_fn):
+    value, error, _ = future.result()
+    if not error:
+        try:
+            discard_fn(value)
+        except Exception:
+            pass
+
+# Records how long each startup phase took, measured from t0
+class StartupTimer:
+    def __init__(self, t0):
+        self.t0 = t0
+        self.phases = []
+        self._last = t0
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def print_report(self, results=()):
+        print(f"Startup took {(self._last - self.t0) * 1000:.0f} ms")
+        for phase, seconds in self.phases:
+            print(f" - {phase}: {seconds * 1000:.0f} ms")
+        for result in sorted(results, key=lambda result: result.seconds, reverse=True):
+            outcome = "ok" if result.ok else result.error
+            print(f"   - {result.name}: {result.seconds * 1000:.0f} ms ({outcome})")
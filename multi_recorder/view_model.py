@@ -0,0 +1,47 @@
+import contextlib
+
+_MISSING = object()
+
+# Remembers the last value and configuration applied to each widget, so the render loop can describe
+# what every widget should show and only the widgets that actually changed are touched. Changes are
+# queued and applied together by flush(), once per frame, inside lock if one is given (dpg.mutex
+# holds the render lock for the whole batch instead of once per call).
+class ViewModel:
+    def __init__(self, set_value, configure_item, lock=contextlib.nullcontext):
+        self._set_value = set_value
+        self._configure_item = configure_item
+        self._lock = lock
+        self._values = {}
+        self._configs = {}
+        self._pending_values = {}
+        self._pending_configs = {}
+
+    def set_value(self, tag, value):
+        if self._values.get(tag, _MISSING) != value:
+            self._values[tag] = value
+            self._pending_values[tag] = value
+
+    def configure(self, tag, **config):
+        current = self._configs.setdefault(tag, {})
+        changed = {name: value for name, value in config.items() if current.get(name, _MISSING) != value}
+        if changed:
+            current.update(changed)
+            self._pending_configs.setdefault(tag, {}).update(changed)
+
+    # Apply every queued change, returns how many widgets were touched
+    def flush(self):
+        if not self._pending_values and not self._pending_configs:
+            return 0
+        values, self._pending_values = self._pending_values, {}
+        configs, self._pending_configs = self._pending_configs, {}
+        with self._lock():
+            for tag, value in values.items():
+                self._set_value(tag, value)
+            for tag, config in configs.items():
+                self._configure_item(tag, **config)
+        return len(values) + len(configs)
+
+    # Forget what a widget shows, so the next change is applied even if it matches, e.g. after it was recreated
+    def invalidate(self, tag):
+        self._values.pop(tag, None)
+        self._configs.pop(tag, None)